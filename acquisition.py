@@ -0,0 +1,241 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Out-of-process acquisition: a worker process owns the sensor pins and
+    does the bit-banging, so that it does not compete for the GIL with the
+    threads of the main process (in particular the DCF77 receiver).
+
+    The worker publishes each sample into a slot in shared memory, which is
+    protected by a sequence lock: the sequence number is odd while the
+    worker writes. A reader copies the slot and accepts the copy if the
+    sequence number was even and did not change meanwhile.
+'''
+import sys
+if sys.hexversion < 0x03000000:
+    from Queue import Empty
+else:
+    from queue import Empty
+import ctypes
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import time
+
+import sht75
+import uptime
+
+logger = logging.getLogger('fancontrol')
+
+NaN = float('NaN')
+
+# The worker is forked: a spawned process would run the main script again.
+try:
+    mp = multiprocessing.get_context('fork')
+except AttributeError: # Python 2
+    mp = multiprocessing
+
+def threadCPUTime():
+    '''CPU time (user + system) of the calling thread in seconds.'''
+    usage = resource.getrusage(getattr(resource, 'RUSAGE_THREAD', 1))
+    return usage.ru_utime + usage.ru_stime
+
+def sampleType(n):
+    '''Layout of the shared slot for n sensors.'''
+    class Sample(ctypes.Structure):
+        _fields_ = [('sequence', ctypes.c_uint64),
+                    ('count', ctypes.c_uint64),
+                    ('T', ctypes.c_double * n),
+                    ('rH', ctypes.c_double * n),
+                    ('tau', ctypes.c_double * n),
+                    ('Error', ctypes.c_bool * n),
+                    ('tT', ctypes.c_double * n),
+                    ('trH', ctypes.c_double * n),
+                    ('cputime', ctypes.c_double)]
+    return Sample
+
+def publish(slot, data, latencies, cputime):
+    '''Write a sample into the slot (single writer).'''
+    slot.sequence += 1
+    for i, (S, (tT, trH)) in enumerate(zip(data, latencies)):
+        slot.T[i], slot.rH[i], slot.tau[i], slot.Error[i] = \
+            S.T, S.rH, S.tau, S.Error
+        slot.tT[i], slot.trH[i] = tT, trH
+    slot.cputime = cputime
+    slot.count += 1
+    slot.sequence += 1
+
+def snapshot(slot, retries=100):
+    '''Consistent copy of the slot, or None if the writer does not finish.'''
+    size = ctypes.sizeof(slot)
+    for i in range(retries):
+        sequence = slot.sequence
+        if sequence % 2 == 0:
+            copy = type(slot)()
+            ctypes.memmove(ctypes.addressof(copy), ctypes.addressof(slot),
+                           size)
+            if slot.sequence == sequence:
+                return copy
+        time.sleep(0.001)
+    return None
+
+class _QueueHandler(logging.Handler):
+    '''Sends the log records of the worker to the main process.'''
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def emit(self, record):
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            record.exc_info = None
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+def _reinitLogging():
+    '''Replace the logging locks after a fork: a lock which another thread
+    of the main process held at the fork is never released in the child.
+    Python 3 does this itself (os.register_at_fork).'''
+    if not hasattr(os, 'register_at_fork'):
+        logging._lock = threading.RLock()
+        for handler in logger.handlers:
+            handler.createLock()
+
+def _worker(pins, resolution, slot, request, done, logqueue, parent):
+    uptime.afterFork()
+    _reinitLogging()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(_QueueHandler(logqueue))
+    logger.propagate = False
+    # The main process handles the signals and terminates the worker.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for signum in (signal.SIGINT, signal.SIGHUP, signal.SIGUSR1,
+                   signal.SIGUSR2):
+        signal.signal(signum, signal.SIG_IGN)
+
+    sensors = [sht75.Sensor(clock, data, resolution) for clock, data in pins]
+    while os.getppid() == parent:
+        if not request.wait(1):
+            continue
+        request.clear()
+        cputime = threadCPUTime()
+        data, latencies = sht75.read_concurrently(sensors)
+        cputime = threadCPUTime() - cputime
+        publish(slot, data, latencies, cputime)
+        done.set()
+
+class Acquisition:
+    '''Supervisor of the acquisition process. It starts the worker,
+    triggers the measurements and restarts the worker if it dies or does
+    not answer within "timeout" seconds. Restarts are at least
+    "restart_interval" seconds apart.'''
+    def __init__(self, pins, resolution=None, timeout=5, restart_interval=10):
+        self.pins = tuple(pins)
+        self.resolution = resolution
+        self.timeout = timeout
+        self.restart_interval = restart_interval
+        self.slot = mp.RawValue(sampleType(len(self.pins)))
+        self.process = None
+        self.started = None
+        self.restarts = 0
+        self.start()
+
+    def start(self):
+        # A worker which died during a write leaves an odd sequence number.
+        if self.slot.sequence % 2:
+            self.slot.sequence += 1
+        # Fresh synchronization objects: a killed worker can leave the old
+        # ones in an inconsistent state.
+        self.request = mp.Event()
+        self.done = mp.Event()
+        self.logqueue = mp.Queue()
+        self.process = mp.Process(target=_worker, name='sensor acquisition',
+                                  args=(self.pins, self.resolution, self.slot,
+                                        self.request, self.done,
+                                        self.logqueue, os.getpid()))
+        self.process.daemon = True
+        self.process.start()
+        self.started = sht75.monotonic()
+
+    def stop(self):
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(1)
+            if self.process.is_alive(): # e.g. stopped
+                os.kill(self.process.pid, signal.SIGKILL)
+            self.process.join()
+            self.process = None
+        self.forwardLog()
+
+    def supervise(self):
+        '''Restart the worker if it has died. Returns whether it is alive.'''
+        self.forwardLog()
+        if self.process is not None and self.process.is_alive():
+            return True
+        if sht75.monotonic() - self.started >= self.restart_interval:
+            self.restart('died')
+        return False
+
+    def restart(self, reason):
+        logger.error('Error, acquisition process {} (exit code {}), '
+                     'restart.'.format(reason, self.process.exitcode))
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def forwardLog(self):
+        while True:
+            try:
+                record = self.logqueue.get_nowait()
+            except Empty:
+                return
+            logger.handle(record)
+
+    def measure(self):
+        '''Measurements, conversion times and CPU time like in
+        Sensor.run; error values if the worker fails.'''
+        if self.supervise():
+            count = self.slot.count
+            self.done.clear()
+            self.request.set()
+            if self.done.wait(self.timeout):
+                sample = snapshot(self.slot)
+                self.forwardLog()
+                if sample is not None and sample.count != count:
+                    return self.decode(sample)
+            elif self.process.is_alive():
+                self.restart('does not answer')
+        n = len(self.pins)
+        return ([sht75.Bunch(rH = NaN, T = NaN, tau = NaN, Error = True)] * n,
+                [(NaN, NaN)] * n, NaN)
+
+    def decode(self, sample):
+        data = [sht75.Bunch(rH = sample.rH[i], T = sample.T[i],
+                            tau = sample.tau[i], Error = sample.Error[i])
+                for i in range(len(self.pins))]
+        latencies = [(sample.tT[i], sample.trH[i])
+                     for i in range(len(self.pins))]
+        return data, latencies, sample.cputime
@@ -17,69 +17,204 @@
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
-from collections import deque
 import logging
+import numpy as np
 
+from configuration import config
 from component import Component
+from history import History, MappedHistory, humanBytes, insufficient
+from pyramid import Pyramid
+import registry
 from sht75 import Bunch
 from uptime import Uptime
 
 logger = logging.getLogger('fancontrol')
 
+capacity = config.getint('history', 'capacity')
+historyfile = config.get('history', 'file') \
+    if config.has_option('history', 'file') else None
+# The measurements are not equally spaced if the sensor adapts its interval.
+max_interval = config.getint('measure', 'max_interval') \
+    if config.has_option('measure', 'max_interval') \
+    else config.getint('measure', 'interval')
+
 NaN = float('NaN')
 
+class RunningSum:
+    '''Sums of (T, rH, tau) and counts of the valid samples, per sensor.
+    Plain Python numbers: for a single sample, they are faster than NumPy
+    operations on tiny arrays.'''
+    def __init__(self, sensors):
+        self.sum = [[0.0, 0.0, 0.0] for i in range(sensors)]
+        self.count = [0] * sensors
+
+    def add(self, values, err):
+        for i, (value, error) in enumerate(zip(values.tolist(), err.tolist())):
+            if not error:
+                s = self.sum[i]
+                s[0] += value[0]
+                s[1] += value[1]
+                s[2] += value[2]
+                self.count[i] += 1
+
+    def remove(self, values, err):
+        for i, (value, error) in enumerate(zip(values.tolist(), err.tolist())):
+            if not error:
+                self.count[i] -= 1
+                if self.count[i] == 0:
+                    # Discard accumulated rounding errors.
+                    self.sum[i] = [0.0, 0.0, 0.0]
+                else:
+                    s = self.sum[i]
+                    s[0] -= value[0]
+                    s[1] -= value[1]
+                    s[2] -= value[2]
+
+    def average(self, timespan, interval):
+        result = []
+        for (T, rH, tau), count in zip(self.sum, self.count):
+            if count > 0:
+                T /= count
+                rH /= count
+                tau /= count
+            else:
+                T = rH = tau = 0
+            Error = insufficient(count, timespan, interval)
+            result.append(Bunch(rH = rH, T = T, tau = tau, Error = Error))
+        return tuple(result)
+
+class Window:
+    '''Running sums over the measurements of the last "timespan" seconds.
+
+    The window covers the samples with absolute indices start...end-1 in the
+    history. Samples are added when they arrive and subtracted when they age
+    out, so an average costs amortized O(1), independent of the window
+    length.'''
+    def __init__(self, timespan, history):
+        self.timespan = timespan
+        self.history = history
+        self.start = self.end = history.first()
+        self.sum = RunningSum(history.sensors)
+        self.update()
+
+    def __add(self, row):
+        uptime, values, err = row
+        self.sum.add(values, err)
+
+    def __remove(self, row):
+        uptime, values, err = row
+        self.sum.remove(values, err)
+
+    def update(self):
+        '''Add the samples which were appended to the history.'''
+        while self.end < self.history.count:
+            self.__add(self.history.row(self.end))
+            self.end += 1
+
+    def expire(self, uptime0, first=0):
+        '''Subtract the samples which are older than "timespan" or which
+        have an absolute index below "first".'''
+        history = self.history
+        while self.start < self.end and \
+              (self.start < first or
+               uptime0 - history.uptime(self.start) > self.timespan):
+            self.__remove(history.row(self.start))
+            self.start += 1
+
+    def average(self, uptime0):
+        # A sample newer than uptime0 (e.g. appended by another thread after
+        # uptime0 was taken) ends the window instead.
+        if self.end > self.start:
+            uptime0 = max(uptime0, self.history.uptime(self.end - 1))
+        self.expire(uptime0)
+        return self.sum.average(self.timespan, self.history.interval)
+
 class Average(Component):
     def __init__(self):
         Component.__init__(self, 'average')
-        self.deque = deque(maxlen = 9000) # enough for 24h
+        if historyfile:
+            self.history = MappedHistory(capacity, historyfile, max_interval,
+                                         len(registry.sensors))
+        else:
+            self.history = History(capacity, max_interval,
+                                   len(registry.sensors))
+        # Windows for further time spans are registered on first use.
+        self.windows = dict((timespan, Window(timespan, self.history))
+                            for timespan in (60, 600))
+        self.pyramid = Pyramid(interval = max_interval,
+                               sensors = len(registry.sensors))
+        for index in range(self.history.first(), self.history.count):
+            self.pyramid.append(self.history.message(index))
+        print('Measurement history: {}.'.format(self.history.footprint()))
+        print('Aggregation pyramid: {}.'.format(humanBytes(self.pyramid.nbytes)))
 
     def __enter__(self):
         with self.lock:
             self.messageboard.subscribe('Measurement', self, Average.onMeasurement)
             self.messageboard.subscribe('Average', self, Average.onAverage)
+            self.messageboard.subscribe('Minimum', self, Average.onMinimum)
+            self.messageboard.subscribe('Maximum', self, Average.onMaximum)
+            self.messageboard.subscribe('Median', self, Average.onMedian)
+            self.messageboard.subscribe('Summary', self, Average.onSummary)
+            # The window ends at the query time: between measurements, the
+            # value only changes when the oldest sample ages out.
+            for timespan in (60, 600):
+                self.messageboard.derive('Average/{}'.format(timespan), self,
+                                         ('Measurement',), Average.onAverage,
+                                         timespan, Average.expiry)
         return Component.__enter__(self)
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        Component.__exit__(self, exc_type, exc_value, traceback)
+        with self.lock:
+            if isinstance(self.history, MappedHistory):
+                self.history.flush()
+
     def onMeasurement(self, message):
         with self.lock:
-            self.deque.appendleft(message)
+            uptime = message[0]
+            # Release the sample which is overwritten in the ring buffer.
+            first = self.history.count + 1 - self.history.capacity
+            for window in self.windows.values():
+                window.expire(uptime, first)
+            self.history.append(message)
+            for window in self.windows.values():
+                window.update()
+            self.pyramid.append(message)
 
     def onAverage(self, message):
         with self.lock:
             uptime0 = Uptime()
             timespan = message
+            window = self.windows.get(timespan)
+            if window is None:
+                window = Window(timespan, self.history)
+                self.windows[timespan] = window
+            return window.average(uptime0)
 
-            T1 = 0
-            rH1 = 0
-            tau1 = 0
-            count1 = 0
-            T2 = 0
-            rH2 = 0
-            tau2 = 0
-            count2 = 0
-
-            for uptime, S1Data, S2Data in self.deque:
-                assert uptime <= uptime0
-                if uptime0 - uptime > timespan:
-                    break
-                if not S1Data.Error:
-                    T1 += S1Data.T
-                    rH1 += S1Data.rH
-                    tau1 += S1Data.tau
-                    count1 += 1
-                if not S2Data.Error:
-                    T2 += S2Data.T
-                    rH2 += S2Data.rH
-                    tau2 += S2Data.tau
-                    count2 += 1
-            if count1 > 0:
-                T1 /= count1
-                rH1 /= count1
-                tau1 /= count1
-            Error1 = count1 < max(1, timespan / 20)
-            if count2 > 0:
-                T2 /= count2
-                rH2 /= count2
-                tau2 /= count2
-            Error2 = count2 < max(1, timespan / 20)
-            return (Bunch(rH = rH1, T = T1, tau = tau1, Error = Error1),
-                    Bunch(rH = rH2, T = T2, tau = tau2, Error = Error2))
+    def expiry(self, timespan):
+        '''Uptime after which the oldest sample in the window ages out, or
+        None for an empty window.'''
+        with self.lock:
+            window = self.windows[timespan]
+            if window.start < window.end:
+                return self.history.uptime(window.start) + timespan
+
+    def reduce(self, timespan, function):
+        with self.lock:
+            return self.history.reduce(Uptime(), timespan, function)
+
+    def onMinimum(self, message):
+        return self.reduce(message, np.min)
+
+    def onMaximum(self, message):
+        return self.reduce(message, np.max)
+
+    def onMedian(self, message):
+        return self.reduce(message, np.median)
+
+    def onSummary(self, message):
+        '''Mean, minimum and maximum over long time spans (days to months),
+        at the resolution of the aggregation pyramid.'''
+        with self.lock:
+            return self.pyramid.summary(Uptime(), message)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Benchmark: cost per measurement of the running-sum windows in
+    average.py compared with a scan over a deque of measurements. The
+    append of a measurement (including the window update) and the average
+    query are timed separately.
+'''
+from __future__ import print_function
+from collections import deque
+import math
+import random
+from timeit import default_timer as timer
+
+from average import Window
+from history import History
+from sht75 import Bunch
+
+interval = 10
+queries = 2000
+
+def sample(uptime):
+    def data(offset):
+        error = random.random() < .01
+        NaN = float('NaN')
+        T = offset + 5 * math.sin(uptime / 43200.0 * math.pi)
+        return Bunch(rH = NaN if error else 60 + random.random(),
+                     T = NaN if error else T,
+                     tau = NaN if error else T - 8,
+                     Error = error)
+    return (uptime, data(20), data(10))
+
+def scanAverage(history, uptime0, timespan):
+    '''The former O(window) algorithm; history is sorted newest first.'''
+    T1 = rH1 = tau1 = count1 = 0
+    T2 = rH2 = tau2 = count2 = 0
+    for uptime, S1Data, S2Data in history:
+        if uptime0 - uptime > timespan:
+            break
+        if not S1Data.Error:
+            T1 += S1Data.T
+            rH1 += S1Data.rH
+            tau1 += S1Data.tau
+            count1 += 1
+        if not S2Data.Error:
+            T2 += S2Data.T
+            rH2 += S2Data.rH
+            tau2 += S2Data.tau
+            count2 += 1
+    if count1 > 0:
+        T1 /= count1
+        rH1 /= count1
+        tau1 /= count1
+    if count2 > 0:
+        T2 /= count2
+        rH2 /= count2
+        tau2 /= count2
+    return (Bunch(rH = rH1, T = T1, tau = tau1,
+                  Error = count1 < max(1, timespan / 20)),
+            Bunch(rH = rH2, T = T2, tau = tau2,
+                  Error = count2 < max(1, timespan / 20)))
+
+def benchmark(timespan):
+    uptime = 0
+    history = deque(maxlen = 9000)
+    ringbuffer = History(9000)
+    for i in range(9000):
+        uptime += interval
+        s = sample(uptime)
+        history.appendleft(s)
+        ringbuffer.append(s)
+    window = Window(timespan, ringbuffer)
+
+    newsamples = []
+    for i in range(queries):
+        uptime += interval
+        newsamples.append(sample(uptime))
+
+    scanAppend = scanQuery = 0
+    for s in newsamples:
+        t0 = timer()
+        history.appendleft(s)
+        t1 = timer()
+        expected = scanAverage(history, s[0], timespan)
+        t2 = timer()
+        scanAppend += t1 - t0
+        scanQuery += t2 - t1
+    runningAppend = runningQuery = 0
+    for s in newsamples:
+        t0 = timer()
+        window.expire(s[0], ringbuffer.count + 1 - ringbuffer.capacity)
+        ringbuffer.append(s)
+        window.update()
+        t1 = timer()
+        result = window.average(s[0])
+        t2 = timer()
+        runningAppend += t1 - t0
+        runningQuery += t2 - t1
+
+    for a, b in zip(expected, result):
+        assert a.Error == b.Error
+        assert abs(a.T - b.T) < 1e-4, (a.T, b.T)
+    return (scanAppend / queries, scanQuery / queries,
+            runningAppend / queries, runningQuery / queries)
+
+if __name__ == '__main__':
+    random.seed(0)
+    print('{:>9} {:>25} {:>25}'.format('', 'Scan/µs', 'Running sum/µs'))
+    print('{:>9} {:>12} {:>12} {:>12} {:>12}'.format(
+        'Window/s', 'append', 'query', 'append', 'query'))
+    for timespan in (60, 600, 3600, 6 * 3600, 24 * 3600):
+        times = benchmark(timespan)
+        print('{:9d} {:12.1f} {:12.1f} {:12.1f} {:12.1f}'.format(
+            timespan, *[t * 1e6 for t in times]))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Benchmark: lines per second of the log reader (logreader.py) compared
+    with the former loop in statistics.py (strip, time.strptime,
+    calendar.timegm), on a synthetic log of one measurement per minute for
+    two sensors over one year (or the number of days given as argument).
+'''
+from __future__ import print_function
+import calendar
+import gzip
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from timeit import default_timer as timer
+
+import logreader
+
+def writeLog(filename, days):
+    '''Synthetic log from 2020-01-01 on. Returns the number of lines.'''
+    start = calendar.timegm((2020, 1, 1, 0, 0, 0))
+    lines = 0
+    fan = False
+    with open(filename, 'w') as f:
+        def log(t, filename, message):
+            f.write('{},{:03d},{:.2f},20,{},{}\n'.format(
+                time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t)),
+                int(t * 1000) % 1000, t - start, filename, message))
+        for minute in range(days * 1440):
+            t = start + minute * 60 + random.random()
+            if minute % (30 * 1440) == 0:
+                log(t, 'control.py', 'Startup')
+                lines += 1
+            if minute % 1440 == 0:
+                log(t, 'dcf77_thread.py', 'dcf77,' + time.strftime(
+                    '%d.%m.%Y, %H:%M UTC', time.gmtime(t)))
+                lines += 1
+            values = []
+            for offset in (20, 10):
+                T = offset + 5 * math.sin(minute / 720.0 * math.pi)
+                values += [60 + random.random(), T, T - 8,
+                           random.random() < .01]
+            log(t, 'sensor.py', ','.join(['measurement'] +
+                                         [str(v) for v in values]))
+            lines += 1
+            if random.random() < 1 / 60.0:
+                fan = not fan
+                if random.random() < .1:
+                    log(t, 'menu.py', 'user,' + ('FanOn' if fan else 'FanOff'))
+                else:
+                    log(t, 'fan.py', 'fan,{}'.format(fan))
+                lines += 1
+    return lines
+
+def formerLoop(filename):
+    '''The former loop of statistics.py over all lines.'''
+    events = 0
+    for line in open(filename, 'r'):
+        entries = [entry.strip() for entry in line.split(',')]
+        t = time.strptime(entries[0], '%Y-%m-%d %H:%M:%S')
+        timestamp = calendar.timegm(t)
+        if entries[4] == 'fan.py' and entries[5] == 'fan':
+            events += entries[6] in ('True', 'False')
+        elif entries[4] == 'control.py' and entries[5] in ('Startup', 'Shutdown'):
+            events += 1
+        elif entries[4] == 'menu.py' and entries[5] == 'user':
+            events += 1
+        elif entries[4] == 'sensor.py' and entries[5] == 'measurement':
+            for i in range((len(entries) - 6) // 4):
+                rH, T, tau, Error = entries[6 + 4 * i:10 + 4 * i]
+                if Error == 'False':
+                    float(T), float(tau)
+            events += 1
+    return events
+
+def count(records):
+    return sum(1 for record in records)
+
+if __name__ == '__main__':
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    random.seed(0)
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'fancontrol.log')
+        lines = writeLog(filename, days)
+        with open(filename, 'rb') as f:
+            with gzip.open(filename + '.gz', 'wb') as g:
+                shutil.copyfileobj(f, g)
+        print('{} days, {} lines, {:.1f} MB.'.format(
+            days, lines, os.path.getsize(filename) / 1e6))
+        day = calendar.timegm((2020, 1, 1, 0, 0, 0)) + (days // 2) * 86400
+        fanTypes = (logreader.Fan, logreader.User, logreader.Startup,
+                    logreader.Shutdown)
+        cases = [
+            ('Former loop', lambda: formerLoop(filename)),
+            ('All records', lambda: count(logreader.read(filename))),
+            ('Fan events', lambda: count(logreader.read(filename, fanTypes))),
+            ('One day', lambda: count(logreader.read(
+                filename, logreader.allTypes, day, day + 86400))),
+            ('All, .gz', lambda: count(logreader.read(filename + '.gz'))),
+        ]
+        print('{:>12} {:>10} {:>12}'.format('Reader', 'Records', 'Lines/s'))
+        for name, run in cases:
+            t0 = timer()
+            records = run()
+            t1 = timer()
+            print('{:>12} {:10d} {:12.0f}'.format(name, records,
+                                                  lines / (t1 - t0)))
+    finally:
+        shutil.rmtree(directory)
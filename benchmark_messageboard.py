@@ -0,0 +1,54 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Micro-benchmark: posts per second of the lock-free message board
+    compared with the original reader-writer lock implementation.
+'''
+from __future__ import print_function
+from timeit import default_timer as timer
+
+from messageboard import MessageBoard, RWLockMessageBoard
+
+class Subscriber:
+    def onTime(self, message):
+        pass
+
+def postsPerSecond(board, subscribers, posts):
+    instances = [Subscriber() for i in range(subscribers)]
+    for instance in instances:
+        board.subscribe('Time', instance, Subscriber.onTime)
+    message = (0.0, None)
+    t0 = timer()
+    for i in range(posts):
+        board.post('Time', message)
+    t1 = timer()
+    for instance in instances:
+        board.unsubscribeAll(instance)
+    return posts / (t1 - t0)
+
+if __name__ == '__main__':
+    print('{:>11} {:>14} {:>16} {:>8}'.format(
+        'Subscribers', 'RWLock post/s', 'Lock-free post/s', 'Speedup'))
+    for subscribers in (1, 10, 100):
+        posts = 200000 // subscribers
+        locked = postsPerSecond(RWLockMessageBoard(), subscribers, posts)
+        lockfree = postsPerSecond(MessageBoard(), subscribers, posts)
+        print('{:11d} {:14.0f} {:16.0f} {:7.2f}x'.format(
+            subscribers, locked, lockfree, lockfree / locked))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Benchmarks for the SHT75 driver against the simulated GPIO (simgpio.py),
+    which emulates the bus protocol of the sensors, so that they run without
+    the hardware:
+
+    1. CPU time of the wait for the end of a conversion: busy wait compared
+       with the edge-triggered wait.
+    2. Cycle accounting for the bit-banging transfer: GPIO calls, sleeps and
+       time per measurement of the former transfer code and the current one.
+    3. Time per measurement at high and low resolution.
+    4. Time per measurement of N sensors on independent pins, read
+       concurrently, compared with reading them one after the other.
+'''
+from __future__ import print_function
+import os
+import resource
+import sys
+import types
+
+from timeit import default_timer as timer
+
+import simgpio
+
+class CountingTime:
+    '''Replacement for the "time" module in sht75 which counts sleeps.'''
+    def __init__(self, module):
+        self.module = module
+        self.sleeps = 0
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.module.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+# A bare simulated GPIO without the sensors from fancontrol.cfg, in place
+# of RPi.GPIO.
+GPIO = simgpio.SimulatedGPIO()
+RPi = types.ModuleType('RPi')
+RPi.GPIO = GPIO
+sys.modules['RPi'] = RPi
+sys.modules['RPi.GPIO'] = GPIO
+os.environ['FANCONTROL_GPIO'] = 'rpi'
+
+# The fake sensors read 20 °C and 50 % relative humidity.
+climate = simgpio.constant(20.0, 50.0)
+
+import sht75
+
+sht75.time = CountingTime(sht75.time)
+
+class LegacySht(sht75.Sht):
+    '''The transfer code before the pin direction was cached: GPIO.setup and
+    time.sleep for every bit.'''
+    def _data_output(self):
+        GPIO.setup(self.pin_data, GPIO.OUT)
+
+    def _data_input(self):
+        GPIO.setup(self.pin_data, GPIO.IN, GPIO.PUD_UP)
+
+    def _data_set(self, v):
+        GPIO.setup(self.pin_data, GPIO.OUT)
+        GPIO.output(self.pin_data, v)
+        sht75.time.sleep(0.0000001)
+
+    def _sck_tick(self, v):
+        GPIO.output(self.pin_sck, v)
+        sht75.time.sleep(0.0000001)
+
+    def _read_bits(self, bits, v=0):
+        tick = self._sck_tick
+        GPIO.setup(self.pin_data, GPIO.IN, GPIO.PUD_UP)
+        for n in range(bits):
+            tick(1)
+            v = (v << 1) + self._data_get()
+            tick(0)
+        return v
+
+def threadCPUTime():
+    usage = resource.getrusage(getattr(resource, 'RUSAGE_THREAD', 1))
+    return usage.ru_utime + usage.ru_stime
+
+def waitCPUTime(edge_wait, conversion_time=0.08, repetitions=10):
+    sht75.EDGE_WAIT = edge_wait
+    shts = []
+    for clock, data in ((7, 11), (13, 15)):
+        GPIO.attach(clock, data, simgpio.Sht75(GPIO, climate, conversion_time))
+        shts.append(sht75.Sht(clock, data, voltage = 3.3))
+    cputime = 0
+    for i in range(repetitions):
+        start = []
+        for sht in shts:
+            sht._start_meas(sht.cmd.rh)
+            start.append(sht75.monotonic())
+        c0 = threadCPUTime()
+        for j, latency in sht75._wait_ready(shts, start):
+            assert latency is not None
+        cputime += threadCPUTime() - c0
+        for sht in shts:
+            sht._finish_meas(sht.cmd.rh)
+    return cputime / repetitions
+
+def transferCost(cls, repetitions=20):
+    '''GPIO calls, sleeps and time for one temperature and humidity
+    measurement; the conversions take 1 ms here.'''
+    sht75.EDGE_WAIT = True
+    GPIO.attach(3, 5, simgpio.Sht75(GPIO, climate, 0.001))
+    sht = cls(3, 5, voltage = 3.3)
+    calls = dict(GPIO.calls)
+    sleeps = sht75.time.sleeps
+    t0 = timer()
+    for i in range(repetitions):
+        T = sht.read_t()
+        rH = sht.read_rh(T)
+    t1 = timer()
+    assert abs(T - 20.0) < .01 and abs(rH - 50.0) < .1, (T, rH)
+    counts = dict((name, (GPIO.calls[name] - calls[name]) / repetitions)
+                  for name in calls)
+    counts['sleep'] = (sht75.time.sleeps - sleeps) / repetitions
+    return counts, (t1 - t0) / repetitions
+
+def measurementTime(resolution, repetitions=3):
+    '''Time for one temperature and humidity measurement with the typical
+    conversion times from the datasheet.'''
+    sensor = simgpio.Sht75(GPIO, climate)
+    GPIO.attach(3, 5, sensor)
+    sht = sht75.Sht(3, 5, voltage = 3.3, resolution = resolution)
+    assert sensor.status == (resolution == 'low')
+    t0 = timer()
+    for i in range(repetitions):
+        T = sht.read_t()
+        rH = sht.read_rh(T)
+    t1 = timer()
+    assert abs(T - 20.0) < .05 and abs(rH - 50.0) < .5, (T, rH)
+    return (t1 - t0) / repetitions
+
+def scaling(n, repetitions=3):
+    '''Time for one measurement of n sensors (low resolution), read
+    concurrently and one after the other.'''
+    sensors = []
+    for i in range(n):
+        clock, data = 100 + 2 * i, 101 + 2 * i
+        GPIO.attach(clock, data, simgpio.Sht75(GPIO, climate))
+        sensors.append(sht75.Sensor(clock, data, resolution = 'low'))
+    t0 = timer()
+    for i in range(repetitions):
+        data, latencies = sht75.read_concurrently(sensors)
+    t1 = timer()
+    for i in range(repetitions):
+        for sensor in sensors:
+            sensor.read()
+    t2 = timer()
+    assert not any(S.Error for S in data)
+    return (t1 - t0) / repetitions, (t2 - t1) / repetitions
+
+if __name__ == '__main__':
+    busy = waitCPUTime(False)
+    edge = waitCPUTime(True)
+    print('CPU time per conversion wait (80 ms conversion, 2 sensors):')
+    print('  Busy wait:           {:8.2f} ms'.format(busy * 1e3))
+    print('  Edge-triggered wait: {:8.2f} ms'.format(edge * 1e3))
+    print()
+    print('Transfer cost per measurement (temperature and humidity):')
+    print('  {:8} {:>6} {:>7} {:>6} {:>6} {:>9}'.format(
+        '', 'setup', 'output', 'input', 'sleep', 'time/ms'))
+    for name, cls in (('Former', LegacySht), ('Current', sht75.Sht)):
+        counts, seconds = transferCost(cls)
+        print('  {:8} {:6.0f} {:7.0f} {:6.0f} {:6.0f} {:9.2f}'.format(
+            name, counts['setup'], counts['output'], counts['input'],
+            counts['sleep'], seconds * 1e3))
+    print()
+    print('Time per measurement (temperature and humidity):')
+    for resolution in ('high', 'low'):
+        print('  {:4} resolution: {:8.1f} ms'.format(
+            resolution, measurementTime(resolution) * 1e3))
+    print()
+    print('Time per measurement of N sensors (low resolution):')
+    print('  {:>3} {:>14} {:>14}'.format('N', 'Concurrent/ms', 'Sequential/ms'))
+    for n in (1, 2, 4, 8):
+        concurrent, sequential = scaling(n)
+        print('  {:3d} {:14.1f} {:14.1f}'.format(
+            n, concurrent * 1e3, sequential * 1e3))
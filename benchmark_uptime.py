@@ -0,0 +1,55 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Micro-benchmark: cost per Uptime() call of the former /proc/uptime
+    reader and of the monotonic and virtual clocks, with 1 and 4 threads
+    calling concurrently.
+'''
+from __future__ import print_function
+import threading
+from timeit import default_timer as timer
+
+import uptime
+
+def callCost(clock, threads, calls=200000):
+    '''Wall time per Uptime() call while "threads" threads call it.'''
+    uptime.setClock(clock)
+    def work():
+        Uptime = uptime.Uptime
+        for i in range(calls // threads):
+            Uptime()
+    workers = [threading.Thread(target=work) for i in range(threads)]
+    t0 = timer()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (timer() - t0) / calls
+
+if __name__ == '__main__':
+    clocks = [('/proc/uptime', uptime.ProcClock())]
+    if uptime.monotonic is not None:
+        clocks += [('Monotonic', uptime.MonotonicClock()),
+                   ('Virtual', uptime.VirtualClock(speed = 1000))]
+    print('{:>13} {:>13} {:>13}'.format('Clock', '1 thread/µs',
+                                        '4 threads/µs'))
+    for name, clock in clocks:
+        print('{:>13} {:13.3f} {:13.3f}'.format(
+            name, callCost(clock, 1) * 1e6, callCost(clock, 4) * 1e6))
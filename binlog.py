@@ -0,0 +1,252 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Binary measurement log, next to the text log: the measurements and the
+    fan, user, startup and shutdown events in fixed-width records, which
+    are read through numpy.memmap without parsing.
+
+    File layout: a 16-byte header (magic, version, number of sensors n,
+    record size), then records of
+
+        time      float64  Unix time
+        uptime    float64
+        kind      uint8    MEASUREMENT, FAN, USER, STARTUP or SHUTDOWN
+        code      uint8    FAN: 1 on, 0 off; USER: index in userActions
+        error     uint16   bit i: sensor i had an error
+        values    float32  (n, 3): T, rH, tau per sensor
+
+    i.e. 44 bytes for two sensors instead of about 120 bytes of text. The
+    file is rotated at local midnight like the text log, with the suffix
+    .YYYY-MM-DD.
+
+    Usage:
+
+        python binlog.py                 Convert the rotated text logs which
+                                         have no binary log yet.
+        python binlog.py TEXT BINARY     Convert one text log.
+'''
+from __future__ import print_function
+import calendar
+import glob
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from configuration import config
+
+MAGIC = b'FCBL'
+VERSION = 1
+
+MEASUREMENT, FAN, USER, STARTUP, SHUTDOWN = range(5)
+userActions = ('FanOff', 'FanOn', 'CloseWindow', 'OpenWindow', 'Mode:auto',
+               'Mode:manual')
+
+fields = ('T', 'rH', 'tau') # as in history.py
+
+headerType = np.dtype([('magic', 'S4'),
+                       ('version', '<u2'),
+                       ('sensors', '<u2'),
+                       ('recordsize', '<u4'),
+                       ('reserved', '<u4')])
+
+def recordType(sensors):
+    assert 1 <= sensors <= 16 # error bits
+    return np.dtype([('time', '<f8'),
+                     ('uptime', '<f8'),
+                     ('kind', 'u1'),
+                     ('code', 'u1'),
+                     ('error', '<u2'),
+                     ('values', '<f4', (sensors, len(fields)))])
+
+def header(sensors):
+    h = np.zeros(1, dtype=headerType)
+    h['magic'] = MAGIC
+    h['version'] = VERSION
+    h['sensors'] = sensors
+    h['recordsize'] = recordType(sensors).itemsize
+    return h.tobytes()
+
+def parseMessage(filename, entries):
+    '''(kind, code, values, error bits) for a message of the controller,
+    split at the commas, or None if it is not recorded. "values" is a list
+    of (T, rH, tau) per sensor.'''
+    what = entries[0]
+    if filename == 'sensor.py' and what == 'measurement':
+        values = []
+        error = 0
+        for i in range((len(entries) - 1) // 4):
+            rH, T, tau, Error = entries[1 + 4 * i:5 + 4 * i]
+            values.append((float(T), float(rH), float(tau)))
+            if Error != 'False':
+                error |= 1 << i
+        return MEASUREMENT, 0, values, error
+    elif filename == 'fan.py' and what == 'fan':
+        if entries[1] in ('True', 'False'):
+            return FAN, entries[1] == 'True', (), 0
+    elif filename == 'menu.py' and what == 'user':
+        if entries[1] in userActions:
+            return USER, userActions.index(entries[1]), (), 0
+    elif filename == 'control.py' and what == 'Startup':
+        return STARTUP, 0, (), 0
+    elif filename == 'control.py' and what == 'Shutdown':
+        return SHUTDOWN, 0, (), 0
+
+def parseLine(line):
+    '''(time, uptime, kind, code, values, error bits) for a line of the
+    text log, or None.'''
+    entries = [entry.strip() for entry in line.split(',')]
+    if len(entries) < 6:
+        return None
+    item = parseMessage(entries[4], entries[5:])
+    if item is None:
+        return None
+    # 'YYYY-MM-DD HH:MM:SS', milliseconds (UTC, see control.py)
+    s = entries[0]
+    t = calendar.timegm((int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                         int(s[11:13]), int(s[14:16]), int(s[17:19])))
+    return (t + int(entries[1]) * .001, float(entries[2])) + item
+
+def encode(items, sensors):
+    '''Records for a list of (time, uptime, kind, code, values, error).'''
+    records = np.zeros(len(items), dtype=recordType(sensors))
+    records['values'] = np.nan
+    for record, (t, uptime, kind, code, values, error) in zip(records, items):
+        record['time'] = t
+        record['uptime'] = uptime
+        record['kind'] = kind
+        record['code'] = code
+        record['error'] = error & 0xffff
+        if values:
+            values = values[:sensors]
+            record['values'][:len(values)] = values
+    return records
+
+def read(filename):
+    '''The records of a binary log as a read-only memory map. A partial
+    record at the end (while it is being written) is left out.'''
+    h = np.fromfile(filename, dtype=headerType, count=1)
+    if len(h) == 0 or h['magic'][0] != MAGIC or h['version'][0] != VERSION:
+        raise ValueError('{} is not a binary log.'.format(filename))
+    dtype = recordType(int(h['sensors'][0]))
+    assert dtype.itemsize == h['recordsize'][0]
+    count = (os.path.getsize(filename) - headerType.itemsize) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='r',
+                     offset=headerType.itemsize, shape=(count,))
+
+def convert(textfile, binaryfile):
+    '''Convert a text log. The number of sensors is the largest one in the
+    measurements. Returns the number of records.'''
+    items = []
+    with open(textfile, 'r') as f:
+        for line in f:
+            item = parseLine(line)
+            if item is not None:
+                items.append(item)
+    sensors = max([len(item[4]) for item in items] + [1])
+    records = encode(items, sensors)
+    with open(binaryfile, 'wb') as f:
+        f.write(header(sensors))
+        records.tofile(f)
+    return len(records)
+
+def convertArchive(logfile, binlogfile):
+    '''Convert the rotated text logs (suffix .YYYY-MM-DD) which do not
+    have a binary log yet.'''
+    for textfile in sorted(glob.glob(logfile + '.????-??-??')):
+        binaryfile = binlogfile + textfile[len(logfile):]
+        if not os.path.exists(binaryfile):
+            print('{} -> {}: {} records.'.format(
+                textfile, binaryfile, convert(textfile, binaryfile)))
+
+class BinaryLog(logging.Handler):
+    '''Logging handler which records the measurements and events of the
+    fancontrol logger in the binary log. Add it to a QueuedHandler (see
+    logqueue.py), so that it writes in the writer thread.'''
+    def __init__(self, filename, sensors):
+        logging.Handler.__init__(self)
+        self.filename = filename
+        self.sensors = sensors
+        self.file = None
+        self.day = None
+
+    def emit(self, record):
+        try:
+            item = parseMessage(record.filename,
+                                record.getMessage().split(','))
+            if item is None:
+                return
+            day = time.localtime(record.created)[:3]
+            if day != self.day:
+                self.__open(day)
+            self.file.write(encode([(record.created, float(record.uptime))
+                                    + item], self.sensors).tobytes())
+        except Exception:
+            self.handleError(record)
+
+    def __open(self, day):
+        '''Open the file for the given local date (year, month, day). A
+        file from another day or with another number of sensors is rotated
+        first.'''
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.__rotate(self.day)
+        elif os.path.exists(self.filename):
+            # From a previous run
+            fileday = time.localtime(os.path.getmtime(self.filename))[:3]
+            try:
+                sensors = read(self.filename).dtype['values'].shape[0]
+            except ValueError:
+                sensors = None
+            if fileday != day or sensors != self.sensors:
+                self.__rotate(fileday)
+        self.day = day
+        self.file = open(self.filename, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(header(self.sensors))
+
+    def __rotate(self, day):
+        target = '{}.{:04}-{:02}-{:02}'.format(self.filename, *day)
+        n = 0
+        while os.path.exists(target + ('.{}'.format(n) if n else '')):
+            n += 1
+        os.rename(self.filename, target + ('.{}'.format(n) if n else ''))
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        logging.Handler.close(self)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        print('{} records.'.format(convert(sys.argv[1], sys.argv[2])))
+    else:
+        convertArchive(config.get('logging', 'logfile'),
+                       config.get('logging', 'binlog'))
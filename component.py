@@ -21,6 +21,7 @@ from threading import Lock, Thread
 import logging
 
 from messageboard import messageboard
+from scheduler import scheduler
 from shutdown import shutdown
 
 logger = logging.getLogger('fancontrol')
@@ -55,6 +56,10 @@ allThreadsAlive = threadManager.allThreadsAlive
 
 class Component:
     messageboard = messageboard
+    scheduler = scheduler
+    # Class names of the components which must be entered before this one,
+    # see launcher.py.
+    requires = ()
 
     def __init__(self, name):
         self.name = name
@@ -64,6 +69,7 @@ class Component:
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        self.scheduler.cancelAll(self)
         self.messageboard.unsubscribeAll(self)
         self.messageboard.post('ExitThread', True)
         print('Exit {} worker.'.format(self.name))
@@ -17,33 +17,39 @@
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
-import sys
-if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
-else:
-    from configparser import RawConfigParser
 import logging
-import logging.handlers
 import os
 import time
 
+# Trace the startup until the first measurement, see startup.py.
+from startup import tracer
+tracer.install()
+
 from average import Average
+from binlog import BinaryLog
 from component import allThreadsAlive
+from configuration import config
 from dcf77_thread import DCF77
 from devices import Devices
 from display import Display
 from fan import Fan
 from htmlwriter import HtmlWriter
+from launcher import Launcher
+from logindex import IndexingFileHandler
+from logqueue import QueuedHandler
 from menu import Menu
 from messageboard import messageboard
+import registry
+from scheduler import Scheduler, scheduler
 from sensor import Sensor
 from signals_handler import signals_handler
 from status import Status
-from uptime import Uptime, UptimeAsString
+from telemetry import Telemetry, telemetry
+from uptime import Time, UptimeAsString
 from wlan import RestartWLAN, CheckNetwork
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
+tracer.uninstall()
+
 logfile = config.get('logging', 'logfile')
 
 logdir = os.path.dirname(os.path.abspath(logfile))
@@ -57,12 +63,18 @@ class ContextFilter(logging.Filter):
         record.uptime = UptimeAsString()
         return True
 logger.addFilter(ContextFilter())
-# File handler: rotate logs daily, keep logs > 2 years
-fh = logging.handlers.TimedRotatingFileHandler(logfile, when='midnight', backupCount=750)
+# File handler: rotate logs daily, keep logs > 2 years, index the rotated
+# logs (see logindex.py)
+fh = IndexingFileHandler(logfile, when='midnight', backupCount=750)
 class UTCFormatter(logging.Formatter):
     converter = time.gmtime
 fh.setFormatter(UTCFormatter('%(asctime)s,%(uptime)s,%(levelno)s,%(filename)s,%(message)s'))
-logger.addHandler(fh)
+# The file is written by a thread of its own, see logqueue.py.
+logger.addHandler(QueuedHandler(fh))
+# Binary log of the measurements and events, see binlog.py
+if config.has_option('logging', 'binlog'):
+    logger.addHandler(QueuedHandler(
+        BinaryLog(config.get('logging', 'binlog'), len(registry.sensors))))
 # Console handler: for warnings and errors
 ch = logging.StreamHandler()
 ch.setLevel(logging.WARNING)
@@ -71,44 +83,39 @@ logger.addHandler(ch)
 
 logger.info('Startup')
 
+# Time the message board callbacks of all components, see telemetry.py.
+messageboard.telemetry = telemetry
+
 signals_handler = signals_handler(messageboard)
 
-with Display(), \
-     Sensor(), \
-     Status(), \
-     HtmlWriter(), \
-     Fan(), \
-     Menu(), \
-     Devices(), \
-     DCF77(), \
-     Average(), \
-     RestartWLAN(), \
-     CheckNetwork():
-    time0 = Uptime()
+def postTime(messageboard, uptime):
+    messageboard.post('Time', (uptime, time.localtime(Time())))
+
+# Components without mutual requirements start concurrently, see launcher.py.
+with Launcher((Display,
+               Sensor,
+               Status,
+               HtmlWriter,
+               Fan,
+               Menu,
+               Devices,
+               DCF77,
+               Average,
+               RestartWLAN,
+               CheckNetwork), tracer):
+    scheduler.periodic('time', messageboard, postTime, 1)
+    scheduler.periodic('scheduler statistics', scheduler,
+                       Scheduler.logStatistics, 3600)
+    scheduler.periodic('telemetry', telemetry, Telemetry.report,
+                       telemetry.interval)
     while messageboard.query('ExitThread') is None:
         exception = messageboard.query('Exception')
         if exception is not None:
             raise exception
-        messageboard.post('Time', (Uptime(), time.localtime()))
-        time1 = Uptime()
-        if not time1 >= time0:
-            logger.warning('Error in uptime: {} < {}.'.format(time1, time0))
-            time0 = time1
-        sleeptime = 1 - time1 + time0
-        if sleeptime <= 0:
-            logger.warning(u'Zero sleep time: {} < {}, Δ={:.1f}s.'.
-                           format(time0, time1, time1-time0))
-        while sleeptime > 0:
-            time.sleep(sleeptime)
-            time1 = Uptime()
-            sleeptime = 1 - time1 + time0
-        if sleeptime > -.1:
-            time0 += 1
-        else:
-            logger.warning('Sleep longer than expected: {} < {}, Δ={:.1f}s.'.
-                           format(time0, time1, time1-time0))
-            time0 = time1
+        # Sleeps until the next job is due, at most for a second.
+        scheduler.runPending()
         if not allThreadsAlive():
             messageboard.post('ExitThread', True)
+    scheduler.logStatistics()
 
 logger.info('Shutdown')
@@ -18,21 +18,16 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 import atexit
-import sys
-if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
-else:
-    from configparser import RawConfigParser
 from datetime import datetime, timedelta, tzinfo
 from timeit import default_timer as timer
-import RPi.GPIO as GPIO
 import threading
 import time
 
+from configuration import config
+from gpio import GPIO
+
 DEBUG = False
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
 dataPin = config.getint('pins', 'dcf77')
 
 def cleanup():
@@ -20,23 +20,18 @@
 import atexit
 import sys
 if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
     from Queue import Queue, Empty
 else:
-    from configparser import RawConfigParser
     from queue import Queue, Empty
-import time
 
-import RPi.GPIO as GPIO
-
-from uptime import Uptime
+from configuration import config
+from gpio import GPIO
+from uptime import Sleep, Uptime
 from component import ComponentWithThread
 
 DEBUG = False
 CLOSE_WINDOW = True
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
 relays = [
     config.getint('pins', 'relay1'),
     config.getint('pins', 'relay2'),
@@ -60,11 +55,14 @@ def delay(seconds):
     time0 = Uptime()
     sleeptime = seconds
     while sleeptime > 0:
-        time.sleep(sleeptime)
+        Sleep(sleeptime)
         time1 = Uptime()
         sleeptime = seconds - time1 + time0
 
 class Devices(ComponentWithThread):
+    # The worker thread posts 'FanState' from the start.
+    requires = ('HtmlWriter',)
+
     def __init__(self):
         ComponentWithThread.__init__(self, 'devices')
         self.isFanOn = False
@@ -19,11 +19,6 @@
 '''
 
 import atexit
-import sys
-if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
-else:
-    from configparser import RawConfigParser
 import os
 import pygame
 import shutil
@@ -31,6 +26,8 @@ import time
 from itertools import count
 
 from component import Component
+from configuration import config
+import registry
 
 DEBUG = False
 
@@ -41,8 +38,6 @@ fontname = 'Droid Sans'
 
 fontsize = 15
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
 endscreen_raw = config.get('screenshot', 'endscreen_raw')
 
 def display_endscreen():
@@ -55,9 +50,11 @@ WHITE = (255, 255, 255)
 YELLOW = (255, 255, 140)
 STATUSBG = (230, 230, 230)
 
-icon_offline = pygame.image.load('/usr/share/icons/HighContrast/16x16/status/network-error.png')
-icon_online = pygame.image.load('/usr/share/icons/HighContrast/16x16/status/network-idle.png')
-icon_unknown = pygame.image.load('/usr/share/icons/HighContrast/16x16/status/network-no-route.png')
+icon_files = {
+    None: '/usr/share/icons/HighContrast/16x16/status/network-no-route.png',
+    True: '/usr/share/icons/HighContrast/16x16/status/network-idle.png',
+    False: '/usr/share/icons/HighContrast/16x16/status/network-error.png',
+}
 
 class Bunch:
     def __init__(self, **kwds):
@@ -85,6 +82,12 @@ class Screen:
         self.in_menu = True # Suppress display update
         self.localtime = time.localtime()
         self.in_menu = False
+        self.icons = {} # loaded on first use, not at startup
+
+    def icon(self, online):
+        if online not in self.icons:
+            self.icons[online] = pygame.image.load(icon_files[online])
+        return self.icons[online]
 
     def clear(self):
         self.screen.fill((255,255,255))
@@ -192,12 +195,7 @@ class Screen:
         fanstatetext, fanstatecolor = self.get_fanstate()
         self.displaytext(fanstatetext, 'l', fanstatecolor)
         online = self.messageboard.query('Network')
-        if online is None:
-            icon = icon_unknown
-        elif online:
-            icon = icon_online
-        else:
-            icon = icon_offline
+        icon = self.icon(None if online is None else bool(online))
         iconpos = icon.get_rect()
         iconpos.top = self.y
         iconpos.right = self.width
@@ -261,7 +259,7 @@ class Display(Component):
     def __enter__(self):
         with self.lock:
             self.messageboard.subscribe('Measurement', self, Display.onMeasurement)
-            self.messageboard.subscribe('Time', self, Display.onTime)
+            self.messageboard.subscribe('Time', self, Display.onTime, queued=True)
             self.messageboard.subscribe('MainScreen', self, Display.onMainScreen)
             self.messageboard.subscribe('Menu', self, Display.onMenu)
             self.messageboard.subscribe('Info', self, Display.onInfo)
@@ -269,7 +267,9 @@ class Display(Component):
 
     def onMeasurement(self, message):
         with self.lock:
-            self.screen.set_measurements(*message[1:])
+            # The screen has room for the two sensors of the fan control.
+            self.screen.set_measurements(message[1 + registry.indoor],
+                                         message[1 + registry.outdoor])
 
     def onTime(self, message):
         uptime, localtime = message
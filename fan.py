@@ -17,25 +17,22 @@
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
-import sys
-if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
-else:
-    from configparser import RawConfigParser
 import logging
 from math import expm1
 
 from component import Component
+from configuration import config
+import registry
 
 DEBUG = False
 
 logger = logging.getLogger('fancontrol')
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
 ventilation_period = config.getfloat('fan', 'ventilation_period')
 
 class Fan(Component):
+    requires = ('Average', 'Devices')
+
     def __init__(self):
         Component.__init__(self, 'fan')
         self.mode = None
@@ -47,7 +44,7 @@ class Fan(Component):
     def __enter__(self):
         with self.lock:
             self.messageboard.subscribe('Mode', self, Fan.onMode)
-            self.messageboard.subscribe('Time', self, Fan.onTime)
+            self.messageboard.subscribe('Time', self, Fan.onTime, queued=True)
         return Component.__enter__(self)
 
     def onMode(self, message):
@@ -64,8 +61,8 @@ class Fan(Component):
         if self.stayOffUntil > uptime:
             return False
 
-        average1 = self.messageboard.ask('Average', 60)
-        average10 = self.messageboard.ask('Average', 60 * 10)
+        average1 = self.messageboard.query('Average/60')
+        average10 = self.messageboard.query('Average/600')
 
         if average1 is None or average10 is None:
             logger.error('fan, Average is None.')
@@ -73,8 +70,8 @@ class Fan(Component):
                                    'Error!')
             return False
 
-        S1Data = average1[0]
-        S2Data = average10[1]
+        S1Data = average1[registry.indoor]
+        S2Data = average10[registry.outdoor]
         if S1Data.Error or S2Data.Error:
             self.messageboard.post('FanComment',
                                    'Not enough samples for average.')
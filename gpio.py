@@ -0,0 +1,43 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    GPIO backend for the hardware modules: "from gpio import GPIO".
+
+    The backend is "rpi" (RPi.GPIO) or "simulated" (simgpio.py). It is
+    selected by the environment variable FANCONTROL_GPIO or else by the
+    option "backend" in section [gpio] of fancontrol.cfg; default: rpi.
+'''
+import os
+
+from configuration import config
+
+backend = os.environ.get('FANCONTROL_GPIO') or \
+    (config.get('gpio', 'backend') if config.has_option('gpio', 'backend')
+     else 'rpi')
+
+if backend == 'rpi':
+    import RPi.GPIO as GPIO
+elif backend == 'simulated':
+    import simgpio
+    GPIO = simgpio.simulation()
+else:
+    raise ValueError('Unknown GPIO backend: {}'.format(backend))
+
+simulated = backend == 'simulated'
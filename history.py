@@ -0,0 +1,294 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+import logging
+import numpy as np
+import os
+
+from sht75 import Bunch
+from uptime import Time, Uptime
+
+logger = logging.getLogger('fancontrol')
+
+NaN = float('NaN')
+
+fields = ('T', 'rH', 'tau')
+
+def recordType(sensors):
+    '''One measurement of all sensors: values[i] = (T, rH, tau) and
+    err[i] for sensor i.'''
+    return np.dtype([('uptime', 'f8'), ('values', 'f4', (sensors, 3)),
+                     ('err', '?', (sensors,))])
+
+# Record of file version 1, for two sensors
+dtype_v1 = np.dtype([('uptime', 'f8'),
+                     ('T1', 'f4'), ('rH1', 'f4'), ('tau1', 'f4'), ('err1', '?'),
+                     ('T2', 'f4'), ('rH2', 'f4'), ('tau2', 'f4'), ('err2', '?')])
+
+header_dtype = np.dtype([('magic', 'S8'), ('version', '<u4'),
+                         ('capacity', '<u4'), ('count', '<u8'),
+                         ('sequence', '<u8'), ('epoch', '<f8'),
+                         ('boot_id', 'S36'), ('sensors', '<u4'),
+                         ('reserved', 'V48')])
+assert header_dtype.itemsize == 128
+magic = b'FANHIST'
+version = 2
+
+def bootId():
+    '''Random ID of the current boot, changes at every reboot.'''
+    with open('/proc/sys/kernel/random/boot_id', 'rb') as f:
+        return f.read().strip()
+
+def humanBytes(n):
+    for e, p in ((30, 'G'), (20, 'M'), (10, 'K')):
+        if n >= 1 << e:
+            return '{:.1f}{}'.format(n / float(1 << e), p)
+    return '{}B'.format(n)
+
+def insufficient(count, timespan, interval=10):
+    '''Error criterion for statistics over "timespan" seconds: fewer than
+    half of the samples at the longest measurement interval.'''
+    return count < max(1, timespan / (2.0 * interval))
+
+class History:
+    '''Measurement history in a preallocated ring buffer.
+
+    Samples are numbered consecutively from 0 on ("absolute index"). Only the
+    last "capacity" samples are kept; older ones are overwritten.
+
+    "interval" is the longest interval between measurements, for the error
+    criterion. Samples need not be equally spaced.'''
+    def __init__(self, capacity, interval=10, sensors=2):
+        assert capacity >= 1
+        self.capacity = capacity
+        self.interval = interval
+        self.sensors = sensors
+        self.data = np.zeros(capacity, dtype=recordType(sensors))
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def footprint(self):
+        return '{} of {} samples, {}'.format(len(self), self.capacity,
+                                            humanBytes(self.nbytes))
+
+    def first(self):
+        '''Absolute index of the oldest sample which is still stored.'''
+        return max(0, self.count - self.capacity)
+
+    def append(self, message):
+        data = message[1:]
+        assert len(data) == self.sensors
+        self.data[self.count % self.capacity] = (
+            message[0],
+            [(S.T, S.rH, S.tau) for S in data],
+            [S.Error for S in data])
+        self.count += 1
+
+    def row(self, index):
+        '''Sample with the given absolute index as (uptime, values, err),
+        see recordType. The arrays are views into the ring buffer.'''
+        assert index >= self.first() and index < self.count
+        record = self.data[index % self.capacity]
+        return float(record['uptime']), record['values'], record['err']
+
+    def message(self, index):
+        '''Sample with the given absolute index in the format of the
+        'Measurement' message.'''
+        uptime, values, err = self.row(index)
+        return (uptime,) + tuple(
+            Bunch(Error = bool(err[i]),
+                  **dict(zip(fields, values[i].tolist())))
+            for i in range(self.sensors))
+
+    def uptime(self, index):
+        return float(self.data['uptime'][index % self.capacity])
+
+    def segments(self):
+        '''The stored samples in chronological order, as one or two views
+        into the ring buffer.'''
+        head = self.count % self.capacity
+        if self.count <= self.capacity:
+            return [self.data[:self.count]]
+        return [self.data[head:], self.data[:head]]
+
+    def window(self, uptime0, timespan):
+        '''Copy of the samples of the last "timespan" seconds before
+        "uptime0", in chronological order. Found by binary search.'''
+        uptime1 = uptime0 - timespan
+        parts = []
+        for segment in self.segments():
+            start = np.searchsorted(segment['uptime'], uptime1, side='left')
+            parts.append(segment[start:])
+        return np.concatenate(parts)
+
+    def reduce(self, uptime0, timespan, function):
+        '''Apply a NumPy reduction (np.mean, np.min, np.max, np.median...) to
+        the valid samples of each sensor in the given window.'''
+        window = self.window(uptime0, timespan)
+        result = []
+        for i in range(self.sensors):
+            valid = window['values'][~window['err'][:, i], i]
+            count = len(valid)
+            values = function(valid, axis=0).tolist() if count else [NaN] * 3
+            result.append(Bunch(Error = insufficient(count, timespan,
+                                                     self.interval),
+                                **dict(zip(fields, values))))
+        return tuple(result)
+
+class MappedHistory(History):
+    '''Measurement history which is backed by a memory-mapped file, so that
+    the controller resumes with the previous measurements after a restart.
+
+    The file consists of a 128-byte header and the ring buffer. Appending a
+    sample only dirties the pages of the record and the header; the kernel
+    writes them back.
+
+    Crash consistency: the sequence counter in the header is odd while a
+    record is being written. If the file is opened with an odd counter, the
+    record at the write position might be incomplete. It is not counted yet,
+    but it might have overwritten the oldest sample, so this is marked as
+    an error.
+
+    Uptimes restart at every reboot. The header stores the wall-clock time
+    of uptime 0 (epoch) and the boot ID. After a reboot, the stored uptimes
+    are shifted by the difference of the epochs, so they are negative for
+    samples from the previous boot. At every open, samples which lie in the
+    future are shifted back to the current uptime.
+
+    Files of version 1 (two sensors, one field per value) are converted.'''
+    def __init__(self, capacity, filename, interval=10, sensors=2):
+        assert capacity >= 1
+        self.capacity = capacity
+        self.interval = interval
+        self.sensors = sensors
+        self.filename = filename
+        dtype = recordType(sensors)
+        size = header_dtype.itemsize + capacity * dtype.itemsize
+        if not self.__valid(size):
+            old = self.__readVersion1()
+            if old is None:
+                logger.warning('Create new measurement history file {}.'.
+                               format(filename))
+            with open(filename, 'wb') as f:
+                f.truncate(size)
+            header = np.memmap(filename, dtype=header_dtype, mode='r+', shape=1)
+            header['magic'] = magic
+            header['version'] = version
+            header['capacity'] = capacity
+            header['sensors'] = sensors
+            if old is not None:
+                header['count'], header['epoch'], header['boot_id'], data = old
+                self.__convertVersion1(data)
+            header.flush()
+            del header
+        self.header = np.memmap(filename, dtype=header_dtype, mode='r+', shape=1)
+        self.data = np.memmap(filename, dtype=dtype, mode='r+',
+                              offset=header_dtype.itemsize, shape=capacity)
+        self.count = int(self.header['count'][0])
+        if self.header['sequence'][0] % 2:
+            self.__repair()
+        self.__rebase()
+
+    def __valid(self, size):
+        if not os.path.isfile(self.filename) or \
+           os.path.getsize(self.filename) != size:
+            return False
+        header = np.fromfile(self.filename, dtype=header_dtype, count=1)[0]
+        return header['magic'] == magic and header['version'] == version \
+            and header['capacity'] == self.capacity \
+            and header['sensors'] == self.sensors
+
+    def __readVersion1(self):
+        '''(count, epoch, boot ID, records) from a file of version 1 with
+        the same capacity, or None.'''
+        if self.sensors != 2 or not os.path.isfile(self.filename) or \
+           os.path.getsize(self.filename) != \
+           header_dtype.itemsize + self.capacity * dtype_v1.itemsize:
+            return None
+        header = np.fromfile(self.filename, dtype=header_dtype, count=1)[0]
+        if header['magic'] != magic or header['version'] != 1 or \
+           header['capacity'] != self.capacity or header['sequence'] % 2:
+            return None
+        mapped = np.memmap(self.filename, dtype=dtype_v1, mode='r',
+                           offset=header_dtype.itemsize, shape=self.capacity)
+        # Copy: the file is recreated.
+        data = np.array(mapped)
+        del mapped
+        logger.warning('Convert measurement history file {} to version {}.'.
+                       format(self.filename, version))
+        return header['count'], header['epoch'], header['boot_id'], data
+
+    def __convertVersion1(self, old):
+        data = np.memmap(self.filename, dtype=recordType(2), mode='r+',
+                         offset=header_dtype.itemsize, shape=self.capacity)
+        data['uptime'] = old['uptime']
+        for i, sensor in enumerate('12'):
+            for j, field in enumerate(fields):
+                data['values'][:, i, j] = old[field + sensor]
+            data['err'][:, i] = old['err' + sensor]
+        data.flush()
+
+    def __repair(self):
+        logger.warning('Measurement history: incomplete write before restart.')
+        if self.count >= self.capacity:
+            slot = self.count % self.capacity
+            data = self.data
+            data['uptime'][slot] = data['uptime'][(slot + 1) % self.capacity]
+            data['err'][slot] = True
+            data['values'][slot] = NaN
+        self.header['sequence'] += 1
+
+    def __rebase(self):
+        uptime = Uptime()
+        epoch = Time() - uptime
+        boot_id = bootId()
+        if self.count:
+            shift = 0.0
+            if self.header['boot_id'][0] != boot_id:
+                shift = float(self.header['epoch'][0]) - epoch
+            uptimes = self.data['uptime']
+            if len(self) < self.capacity:
+                uptimes = uptimes[:self.count]
+            # Stored samples must not lie in the future, e.g. after a wrong
+            # wall clock at the previous boot or a run with a virtual clock
+            # (uptime.py).
+            shift = min(shift, uptime - float(uptimes.max()))
+            if shift:
+                uptimes += shift
+                logger.info('Measurement history: {} samples rebased by '
+                            '{:.0f}s.'.format(len(self), shift))
+        self.header['epoch'] = epoch
+        self.header['boot_id'] = boot_id
+
+    def append(self, message):
+        header = self.header
+        header['sequence'] += 1
+        History.append(self, message)
+        header['count'] = self.count
+        header['sequence'] += 1
+
+    def flush(self):
+        self.data.flush()
+        self.header.flush()
@@ -19,10 +19,8 @@
 '''
 import sys
 if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
     import Queue
 else:
-    from configparser import RawConfigParser
     import queue
 import codecs
 import datetime
@@ -31,15 +29,15 @@ import shutil
 import time
 
 from ip import get_ip_address, get_wan_ip
+import registry
 from uptime import Uptime
 from component import Component
+from configuration import config
 
 progstart = Uptime()
 
 DEBUG = False
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
 pagefilename = config.get('webserver', 'page')
 pagetempfilename = config.get('webserver', 'temppage')
 datafilename = config.get('webserver', 'data')
@@ -70,12 +68,41 @@ class PageGenerator:
         self.set_mode(None)
         self.set_fanstate(None)
         self.last_sync = None
-        self.S1 = Bunch(T=float('nan'), tau=float('nan'), rH=float('nan'))
-        self.S2 = Bunch(T=float('nan'), tau=float('nan'), rH=float('nan'))
+        self.set_measurements(*[Bunch(T=float('nan'), tau=float('nan'),
+                                      rH=float('nan'))
+                                for name in registry.names])
 
-    def set_measurements(self, S1, S2):
-        self.S1 = S1
-        self.S2 = S2
+    def set_measurements(self, *sensors):
+        self.sensors = sensors
+        # The live data (data.txt) has the two sensors of the fan control.
+        self.S1 = sensors[registry.indoor]
+        self.S2 = sensors[registry.outdoor]
+
+    def sensor_rows(self):
+        '''Table rows with the names and values of all sensors.'''
+        header = u''.join(u'''
+    <td class="c">
+      {}
+    </td>'''.format(label) for label in registry.labels)
+        rows = [u'''  <tr class="hr">
+    <td>
+    </td>{}
+  </tr>'''.format(header)]
+        for field, label, rowclass in (
+                ('rH', u'Relative humidity in %', u' class="bg"'),
+                ('T', u'Temperature in °C', u''),
+                ('tau', u'Dew point in °C', u' class="bg"')):
+            cells = u''.join(u'''
+    <td class="c" style="{}">
+      {}
+    </td>'''.format(getattr(CSSstyle(S), field), prettyPrint(getattr(S, field)))
+                             for S in self.sensors)
+            rows.append(u'''  <tr{}>
+    <td>
+      {}
+    </td>{}
+  </tr>'''.format(rowclass, label, cells))
+        return u'\n'.join(rows)
 
     def set_status(self, status):
         self.statustxt = status[0]
@@ -136,90 +163,48 @@ td.r {{text-align:right;}}
 <h1>Fan control</h1>
 <table>
   <tr>
-    <td colspan="3">
+    <td colspan="{colspan}">
       {date}<span style="float:right">{time}</span>
     </td>
   </tr>
-  <tr class="hr">
-    <td>
-    </td>
-    <td class="c">
-      Indoors
-    </td>
-    <td class="c">
-      Outdoors
-    </td>
-  </tr>
-  <tr class="bg">
-    <td>
-      Relative humidity in %
-    </td>
-    <td class="c" style="{S1Color.rH}">
-      {S1rH}
-    </td>
-    <td class="c" style="{S2Color.rH}">
-      {S2rH}
-    </td>
-  </tr>
-  <tr>
-    <td>
-      Temperature in °C
-    </td>
-    <td class="c" style="{S1Color.T}">
-      {S1T}
-    </td>
-    <td class="c" style="{S2Color.T}">
-      {S2T}
-    </td>
-  </tr>
-  <tr class="bg">
-    <td>
-      Dew point in °C
-    </td>
-    <td class="c" style="{S1Color.tau}">
-      {S1tau}
-    </td>
-    <td class="c" style="{S2Color.tau}">
-      {S2tau}
-    </td>
-  </tr>
+{sensorrows}
   <tr>
-    <td colspan="3" style="{fanstatestyle}">
+    <td colspan="{colspan}" style="{fanstatestyle}">
       {modetxt}{fanstatetxt}
     </td>
   </tr>
   <tr class="bg hr">
-    <td colspan="3" style="{statusstyle}">
+    <td colspan="{colspan}" style="{statusstyle}">
       {statustxt}
     </td>
   </tr>
   <tr>
-    <td colspan="3">
+    <td colspan="{colspan}">
       IP Ethernet:&nbsp;<span style="float:right">{IPeth0}</span>
     </td>
   </tr>
   <tr class="bg">
-    <td colspan="3">
+    <td colspan="{colspan}">
       IP WLAN:&nbsp;<span style="float:right">{IPwlan0}</span>
     </td>
   </tr>
   <tr>
-    <td colspan="3">
+    <td colspan="{colspan}">
       IP WAN:&nbsp;<span style="float:right">{IPwan}</span>
     </td>
   </tr>
   <tr class="bg">
-    <td colspan="3">
+    <td colspan="{colspan}">
       OS uptime:&nbsp;<span style="float:right">{uptime}</span>
     </td>
   </tr>
   <tr>
-    <td colspan="3">
+    <td colspan="{colspan}">
       Controller uptime:&nbsp;<span style="float:right">{progtime}</span>
     </td>
   </tr>
   <tr class="bg">
-    <td colspan="3">
+    <td colspan="{colspan}">
       Last DCF77 signal:&nbsp;<span style="float:right">{lastsync}</span>
     </td>
   </tr>
@@ -229,13 +214,8 @@ td.r {{text-align:right;}}
 '''.
                     format(date=time.strftime("%d.%m.%Y", localtime),
                            time=time.strftime("%H:%M:%S", localtime),
-                           S1rH=prettyPrint(self.S1.rH),
-                           S2rH=prettyPrint(self.S2.rH),
-                           S1T=prettyPrint(self.S1.T),
-                           S2T=prettyPrint(self.S2.T),
-                           S1tau=prettyPrint(self.S1.tau),
-                           S2tau=prettyPrint(self.S2.tau),
-                           S1Color=CSSstyle(self.S1), S2Color=CSSstyle(self.S2),
+                           sensorrows=self.sensor_rows(),
+                           colspan=len(self.sensors) + 1,
                            statustxt = self.statustxt,
                            statusstyle = self.statusstyle,
                            modetxt = self.modetxt,
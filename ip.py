@@ -18,7 +18,6 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
 import fcntl
-import requests
 import socket
 import struct
 
@@ -35,6 +34,8 @@ def get_ip_address(ifname='wlan0'):
         return 'None'
 
 def get_wan_ip():
+    # requests takes long to import and is needed only here.
+    import requests
     try:
         r = requests.get('http://whatismyip.akamai.com', timeout=1, stream=True)
         # Validate the result: a plain text ip address.
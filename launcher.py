@@ -0,0 +1,154 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Parallel startup of the components.
+
+    Each component class declares the class names of the components which
+    it requires in "requires" (see component.py): these must be created and
+    entered before it, usually because it posts messages to them. Every
+    component is created and entered in a thread of its own as soon as its
+    requirements are, so e.g. the display initializes while the devices
+    close the window. On exit, the components are left in the reverse order
+    in which they were entered.
+'''
+from __future__ import print_function
+import logging
+import sys
+from threading import Event, Lock, Thread
+from timeit import default_timer as timer
+
+logger = logging.getLogger('fancontrol')
+
+def startupOrder(classes):
+    '''The classes in an order which respects the requirements. Raises
+    ValueError for unknown requirements and cycles.'''
+    byName = dict((cls.__name__, cls) for cls in classes)
+    for cls in classes:
+        for name in cls.requires:
+            if name not in byName:
+                raise ValueError('{} requires {}, which is not launched.'.
+                                 format(cls.__name__, name))
+    order = []
+    remaining = list(classes)
+    while remaining:
+        ready = [cls for cls in remaining
+                 if all(byName[name] in order for name in cls.requires)]
+        if not ready:
+            raise ValueError('Cyclic requirements between {}.'.format(
+                ', '.join(cls.__name__ for cls in remaining)))
+        order += ready
+        remaining = [cls for cls in remaining if cls not in ready]
+    return order
+
+class Launcher:
+    '''Context manager which creates and enters the components of the given
+    classes concurrently. If "tracer" is given (see startup.py), the times
+    of __init__ and __enter__ are recorded there.'''
+    def __init__(self, classes, tracer=None):
+        self.classes = startupOrder(classes)
+        self.tracer = tracer
+        self.lock = Lock()
+        self.entered = []
+        self.failed = set()
+        self.errors = []
+        self.timeline = []
+        self.done = dict((cls.__name__, Event()) for cls in self.classes)
+
+    def __enter__(self):
+        self.start = timer()
+        threads = [Thread(None, self.__launch, 'launch ' + cls.__name__,
+                          (cls,)) for cls in self.classes]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                # With a timeout, the wait can be interrupted by signals
+                # under Python 2.
+                while thread.is_alive():
+                    thread.join(1)
+        except BaseException:
+            for thread in threads:
+                if thread.ident is not None:
+                    thread.join()
+            self.__exit__(*sys.exc_info())
+            raise
+        self.printTimeline()
+        if self.errors:
+            self.__exit__(None, None, None)
+            raise self.errors[0]
+        return self
+
+    def __launch(self, cls):
+        name = cls.__name__
+        for required in cls.requires:
+            self.done[required].wait()
+        try:
+            if self.failed.intersection(cls.requires):
+                with self.lock:
+                    self.failed.add(name)
+                return
+            start = timer()
+            component = cls()
+            initialized = timer()
+            component.__enter__()
+            entered = timer()
+            with self.lock:
+                self.entered.append(component)
+                self.timeline.append((name, start - self.start,
+                                      initialized - self.start,
+                                      entered - self.start))
+            if self.tracer is not None:
+                self.tracer.record(name + '.__init__', initialized - start)
+                self.tracer.record(name + '.__enter__', entered - initialized)
+        except Exception as e:
+            logger.exception('Startup of {} failed.'.format(name))
+            with self.lock:
+                self.failed.add(name)
+                self.errors.append(e)
+        finally:
+            self.done[name].set()
+
+    def printTimeline(self):
+        print('Startup timeline in seconds:')
+        print('  {:16} {:>7} {:>7} {:>7}'.format('', 'start', 'init', 'enter'))
+        for name, start, initialized, entered in sorted(
+                self.timeline, key=lambda item: item[1]):
+            print('  {:16} {:7.3f} {:7.3f} {:7.3f}'.format(
+                name, start, initialized, entered))
+        for name in sorted(self.failed):
+            print('  {:16} failed'.format(name))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Like nested with blocks, every component is exited, also if one
+        # raises SystemExit (a second signal) or KeyboardInterrupt; the
+        # first of these is re-raised afterwards.
+        interrupt = None
+        while self.entered:
+            component = self.entered.pop()
+            try:
+                component.__exit__(exc_type, exc_value, traceback)
+            except Exception:
+                logger.exception('Exit of {} failed.'.format(
+                    type(component).__name__))
+            except BaseException:
+                if interrupt is None:
+                    interrupt = sys.exc_info()[1]
+        if interrupt is not None:
+            raise interrupt
@@ -22,7 +22,7 @@ Switch a LED on (and leave it on). This is useful as a status signal whether
 the Raspberry Pi is still working or has finished the shutdown sequence.
 At shutdown, all GPIO ports are reconfigured as input, and the LED goes out.
 '''
-import RPi.GPIO as GPIO
+from gpio import GPIO
 from ConfigParser import RawConfigParser
 config = RawConfigParser()
 config.read('fancontrol.cfg')
@@ -0,0 +1,181 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Index for rotated text logs, in a sidecar file .<log file name>.idx
+    (hidden, so that the rotation does not count it as a backup):
+
+        size      size of the log file in bytes, to detect a stale index
+        end       length of the text in bytes
+        minute    first minute in the file (Unix time // 60)
+        offsets   byte offset of the first line of each following minute
+        first     (timestamp, state) of the first fan event or None
+        last      (timestamp, state) of the last fan event or None
+
+    Fan events are the fan decisions, the user commands FanOn and FanOff
+    and startup and shutdown; the state is True (on), False (off) or None
+    (startup or shutdown). With the index, statistics.py looks up the fan
+    state at the midnights before and after a day without reading the
+    neighboring logs, and offset() seeks to a time in O(1).
+
+    The controller writes the index at each rotation. Without an index,
+    lookup() scans the log. For a compressed log (see logreader.py), the
+    offsets are in the uncompressed text.
+
+    Usage: python logindex.py    Index the rotated logs without an index.
+'''
+from __future__ import print_function
+import glob
+import json
+import logging.handlers
+import os
+
+from configuration import config
+import logreader
+
+VERSION = 2
+
+def indexPath(logfile):
+    dirname, basename = os.path.split(logfile)
+    return os.path.join(dirname, '.' + basename + '.idx')
+
+def fanState(recordType, message):
+    '''True (on), False (off), None (startup or shutdown) for a fan event,
+    else Ellipsis.'''
+    if recordType is logreader.Fan:
+        if message in ('True', 'False'):
+            return message == 'True'
+    elif recordType is logreader.User:
+        if message in ('FanOn', 'FanOff'):
+            return message == 'FanOn'
+    elif recordType in (logreader.Startup, logreader.Shutdown):
+        return None
+    return Ellipsis
+
+def scan(logfile):
+    '''Build the index of a text log. Lines without a timestamp (e.g.
+    tracebacks) are skipped.'''
+    first = last = None
+    minute0 = None
+    offsets = []
+    offset = 0
+    parseTime = logreader.TimeParser()
+    with logreader.openLog(logfile, 'rb') as f:
+        for line in f:
+            length = len(line)
+            entries = line.decode('utf-8', 'replace').split(',', 6)
+            try:
+                t = parseTime(entries[0])
+            except ValueError:
+                offset += length
+                continue
+            minute = t // 60
+            if minute0 is None:
+                minute0 = minute
+            while minute0 + len(offsets) <= minute:
+                offsets.append(offset)
+            if len(entries) >= 6:
+                state = fanState(logreader.recordTypes.get(
+                    (entries[4], entries[5].strip())),
+                    entries[6].strip() if len(entries) > 6 else '')
+                if state is not Ellipsis:
+                    if first is None:
+                        first = (t, state)
+                    last = (t, state)
+            offset += length
+    return dict(version = VERSION,
+                size = os.path.getsize(logreader.path(logfile)),
+                end = offset,
+                minute = minute0,
+                offsets = offsets,
+                first = first,
+                last = last)
+
+def read(logfile):
+    '''The index of a log file, or None if it is missing or stale.'''
+    try:
+        with open(indexPath(logfile)) as f:
+            index = json.load(f)
+        if index['version'] == VERSION and \
+                index['size'] == os.path.getsize(logreader.path(logfile)):
+            return index
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+def write(logfile, index):
+    filename = indexPath(logfile)
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.rename(filename + '.tmp', filename)
+
+def lookup(logfile, store=False):
+    '''The index of a log file. If there is none, the log is scanned, and
+    with store=True, the index is saved (for rotated logs, which do not
+    change any more).'''
+    index = read(logfile)
+    if index is None:
+        index = scan(logfile)
+        if store:
+            try:
+                write(logfile, index)
+            except (IOError, OSError):
+                pass
+    return index
+
+def offset(index, t):
+    '''Byte offset of the first line at or after the minute of the Unix
+    time t.'''
+    k = int(t // 60) - (index['minute'] or 0)
+    if k <= 0:
+        return 0
+    if k >= len(index['offsets']):
+        return index['end']
+    return index['offsets'][k]
+
+def indexArchive(logfile):
+    '''Index the rotated logs without a (valid) index.'''
+    for rotated in sorted(glob.glob(logfile + '.????-??-??')):
+        if read(rotated) is None:
+            write(rotated, scan(rotated))
+            print('Indexed {}.'.format(rotated))
+
+def removeOrphans(logfile):
+    '''Remove the indices of rotated logs which were deleted.'''
+    dirname, basename = os.path.split(logfile)
+    for filename in glob.glob(os.path.join(dirname,
+                                           '.' + basename + '.*.idx')):
+        if not logreader.exists(os.path.join(
+                dirname, os.path.basename(filename)[1:-len('.idx')])):
+            os.remove(filename)
+
+class IndexingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    '''TimedRotatingFileHandler which indexes each rotated log.'''
+    def doRollover(self):
+        logging.handlers.TimedRotatingFileHandler.doRollover(self)
+        try:
+            rotated = sorted(glob.glob(self.baseFilename + '.????-??-??'))
+            if rotated:
+                write(rotated[-1], scan(rotated[-1]))
+            removeOrphans(self.baseFilename)
+        except (IOError, OSError):
+            logging.getLogger('fancontrol').exception(
+                'Log index failed.')
+
+if __name__ == '__main__':
+    indexArchive(config.get('logging', 'logfile'))
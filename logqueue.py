@@ -0,0 +1,166 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Queued logging: the logging threads only append the record to a
+    bounded queue, and a writer thread writes the records to the log file,
+    so that a slow SD card or the rollover at midnight does not delay the
+    sensor readout or the scheduler.
+
+    The writer collects the records for up to "linger" seconds and writes
+    them with one write and one flush. The lines are formatted by the file
+    handler as before, so the log format does not change. If the queue is
+    full, records are dropped, and their number is logged afterwards.
+'''
+import sys
+from collections import deque
+import logging
+from threading import Condition, Thread, current_thread
+from timeit import default_timer as timer
+
+class QueuedHandler(logging.Handler):
+    '''Handler which passes the records on to "target" in a writer thread.
+    At most "maxlen" records wait in the queue.'''
+    def __init__(self, target, maxlen=10000, linger=0.1):
+        logging.Handler.__init__(self)
+        self.target = target
+        self.maxlen = maxlen
+        self.linger = linger
+        self.queue = deque()
+        self.condition = Condition()
+        self.running = True
+        self.busy = False
+        self.dropped = 0 # since the last report
+        self.totalDropped = 0
+        self.batches = 0
+        self.records = 0
+        self.thread = Thread(None, self.__run, 'log writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def prepare(self, record):
+        '''Merge the arguments and the exception into the text in the
+        calling thread: the arguments may change, and the traceback is
+        gone later.'''
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            formatter = self.target.formatter or logging.Formatter()
+            record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        record = self.prepare(record)
+        with self.condition:
+            if self.running:
+                if len(self.queue) >= self.maxlen:
+                    self.dropped += 1
+                    self.totalDropped += 1
+                else:
+                    self.queue.append(record)
+                    self.condition.notify_all()
+                return
+        # After close(), write directly.
+        self.write([record])
+
+    def __run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                end = timer() + self.linger
+                while self.running and len(self.queue) < self.maxlen // 2:
+                    remaining = end - timer()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if not self.queue:
+                    return
+                records = list(self.queue)
+                self.queue.clear()
+                dropped, self.dropped = self.dropped, 0
+                self.busy = True
+            try:
+                self.write(records)
+            except Exception:
+                self.handleError(records[-1])
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+            if dropped:
+                logging.getLogger(records[-1].name).warning(
+                    'Log queue full: {} records dropped.'.format(dropped))
+
+    def write(self, records):
+        '''Write the records to the target: for a file, with one write and
+        one flush, and with the rollover of rotating handlers.'''
+        target = self.target
+        if not isinstance(target, logging.StreamHandler):
+            for record in records:
+                target.handle(record)
+            target.flush()
+            return
+        rotating = hasattr(target, 'shouldRollover')
+        lines = []
+        target.acquire()
+        try:
+            for record in records:
+                if record.levelno < target.level or not target.filter(record):
+                    continue
+                if rotating and target.shouldRollover(record):
+                    self.__write(lines)
+                    lines = []
+                    target.doRollover()
+                line = target.format(record) + getattr(target, 'terminator',
+                                                       '\n')
+                if sys.hexversion < 0x03000000 and isinstance(line, unicode):
+                    line = line.encode('utf-8')
+                lines.append(line)
+            self.__write(lines)
+        finally:
+            target.release()
+        self.batches += 1
+        self.records += len(records)
+
+    def __write(self, lines):
+        if lines:
+            target = self.target
+            if target.stream is None: # FileHandler with delay=True
+                target.stream = target._open()
+            target.stream.write(''.join(lines))
+            target.flush()
+
+    def flush(self):
+        '''Wait until the queued records are written.'''
+        with self.condition:
+            while (self.queue or self.busy) and self.thread.is_alive():
+                self.condition.wait(.1)
+        self.target.flush()
+
+    def close(self):
+        '''Write the queued records and stop the writer thread.'''
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not current_thread():
+            self.thread.join()
+        self.target.close()
+        logging.Handler.close(self)
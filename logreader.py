@@ -0,0 +1,165 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Streaming reader for the text log. A line is
+
+        YYYY-MM-DD HH:MM:SS,ms,uptime,level,file name,message
+
+    with the time in UTC (see control.py). read() yields the events as
+    records, with the time in whole seconds like the former reader in
+    statistics.py (the milliseconds are not used):
+
+        Measurement(time, uptime, values)   values: (rH, T, tau, error) per
+                                            sensor
+        Fan(time, uptime, on)
+        User(time, uptime, action)          e.g. 'FanOn', 'Mode:auto'
+        Startup(time, uptime)
+        Shutdown(time, uptime)
+        DCF77(time, uptime, date)
+
+    Lines are split only up to the message head to select the record type,
+    then the time is checked against the range, and only then the message
+    is parsed. The time parser caches the minute, which consecutive lines
+    mostly share, since time.strptime is slow. Lines which do not parse
+    (e.g. tracebacks) are skipped. A log which was compressed to
+    <name>.gz is read transparently. lines() yields the messages unparsed,
+    for bulk parsing (see statistics.py).
+'''
+import calendar
+from collections import namedtuple
+import gzip
+import io
+import os
+import sys
+
+Measurement = namedtuple('Measurement', ('time', 'uptime', 'values'))
+Fan = namedtuple('Fan', ('time', 'uptime', 'on'))
+User = namedtuple('User', ('time', 'uptime', 'action'))
+Startup = namedtuple('Startup', ('time', 'uptime'))
+Shutdown = namedtuple('Shutdown', ('time', 'uptime'))
+DCF77 = namedtuple('DCF77', ('time', 'uptime', 'date'))
+
+# (file name, message head) -> record type
+recordTypes = {('sensor.py', 'measurement'): Measurement,
+               ('fan.py', 'fan'): Fan,
+               ('menu.py', 'user'): User,
+               ('control.py', 'Startup'): Startup,
+               ('control.py', 'Shutdown'): Shutdown,
+               ('dcf77_thread.py', 'dcf77'): DCF77}
+
+allTypes = tuple(recordTypes.values())
+
+class TimeParser:
+    '''Unix time of 'YYYY-MM-DD HH:MM:SS' in UTC, in whole seconds. Raises
+    ValueError for other strings.'''
+    def __init__(self):
+        self.minute = None
+        self.base = None
+
+    def __call__(self, s):
+        if len(s) != 19:
+            raise ValueError(s)
+        if s[:16] != self.minute:
+            self.base = calendar.timegm((int(s[0:4]), int(s[5:7]),
+                                         int(s[8:10]), int(s[11:13]),
+                                         int(s[14:16]), 0))
+            self.minute = s[:16]
+        return self.base + int(s[17:19])
+
+def path(filename):
+    '''The name of the log file or, if only the compressed log exists, of
+    that.'''
+    if not os.path.exists(filename) and os.path.exists(filename + '.gz'):
+        return filename + '.gz'
+    return filename
+
+def exists(filename):
+    return os.path.isfile(path(filename))
+
+def openLog(filename, mode='r'):
+    '''Open a log, or its compressed version, for reading in text ('r') or
+    binary ('rb') mode.'''
+    filename = path(filename)
+    if filename.endswith('.gz'):
+        f = gzip.open(filename, 'rb')
+        if mode == 'r' and sys.hexversion >= 0x03000000:
+            f = io.TextIOWrapper(f)
+        return f
+    return open(filename, mode)
+
+def parseMessage(recordType, t, uptime, message):
+    '''The record for the message after the head, or None.'''
+    if recordType is Measurement:
+        entries = message.split(',')
+        values = []
+        for i in range(len(entries) // 4):
+            rH, T, tau, Error = entries[4 * i:4 * i + 4]
+            values.append((float(rH), float(T), float(tau),
+                           Error.strip() != 'False'))
+        return Measurement(t, uptime, values)
+    message = message.strip()
+    if recordType is Fan:
+        if message in ('True', 'False'):
+            return Fan(t, uptime, message == 'True')
+    elif recordType is User:
+        return User(t, uptime, message)
+    elif recordType is DCF77:
+        return DCF77(t, uptime, message)
+    else:
+        return recordType(t, uptime)
+
+def lines(filename, types=allTypes, start=None, end=None, offset=0):
+    '''Generator of (record type, time, uptime, message) for the lines of
+    the given types in a log, with start <= time < end if given. The
+    message is the text after the head, unparsed. Reading starts at the
+    byte offset (e.g. from logindex.offset()).'''
+    types = frozenset(types)
+    parseTime = TimeParser()
+    with openLog(filename) as f:
+        if offset:
+            f.seek(offset)
+        for line in f:
+            entries = line.split(',', 6)
+            if len(entries) < 6:
+                continue
+            recordType = recordTypes.get((entries[4], entries[5].strip()))
+            if recordType not in types:
+                continue
+            try:
+                t = parseTime(entries[0])
+                if (start is not None and t < start) or \
+                        (end is not None and t >= end):
+                    continue
+                uptime = float(entries[2])
+            except ValueError:
+                continue
+            yield recordType, t, uptime, entries[6] if len(entries) > 6 else ''
+
+def read(filename, types=allTypes, start=None, end=None, offset=0):
+    '''Generator of the records of the given types in a log, with
+    start <= time < end if given. Reading starts at the byte offset.'''
+    for recordType, t, uptime, message in lines(filename, types, start, end,
+                                               offset):
+        try:
+            record = parseMessage(recordType, t, uptime, message)
+        except ValueError:
+            continue
+        if record is not None:
+            yield record
@@ -17,26 +17,19 @@
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
-import sys
-if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
-else:
-    from configparser import RawConfigParser
 import datetime
 import logging
-import psutil
-import RPi.GPIO as GPIO
 from threading import Lock
 import time
 
 from component import Component
+from configuration import config
+from gpio import GPIO
 from ip import get_ip_address
 from uptime import Uptime
 
 logger = logging.getLogger('fancontrol')
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
 button_left = config.getint('pins', 'button_left')
 button_right = config.getint('pins', 'button_right')
 button_front = config.getint('pins', 'button_front')
@@ -70,6 +63,10 @@ class Buttoncontroller:
         GPIO.add_event_detect(button, GPIO.BOTH, callback=wrapped_callback, bouncetime=100)
 
 class Menu(Component):
+    # Receivers of the messages from the menu
+    requires = ('Display', 'Devices', 'Fan', 'HtmlWriter', 'RestartWLAN',
+                'Status')
+
     def __init__(self):
         Component.__init__(self, 'menu')
         self.menus = [MainScreen(self.messageboard)]
@@ -264,6 +261,7 @@ def humanBytes(n):
     return "{}B".format(n)
 
 def getAvailableRAM():
+    import psutil
     return humanBytes(psutil.virtual_memory().available)
 
 class InfoScreen:
@@ -17,12 +17,17 @@
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from threading import Condition, Lock, Thread, current_thread
+from timeit import default_timer as timer
 import weakref
 
 from rwlock import RWLock, RWLockReaderPriority
+from uptime import Uptime
 
-class MessageBoard:
+class RWLockMessageBoard:
+    '''Original message board: every post and ask takes the reader-writer
+    locks. Kept for comparison, see benchmark_messageboard.py.'''
     def __init__(self):
         self.messages = {}
         self.messageLock = RWLock()
@@ -77,4 +82,244 @@ class MessageBoard:
                     if instance is not None:
                         return callback(instance, message)
 
+class QueuedCallback:
+    '''Deliver messages to a subscriber through a bounded queue which is
+    processed by a worker thread of its own, so that the posting thread does
+    not wait for the callback. If the queue is full, the oldest message is
+    dropped; with maxlen=1, only the latest message is delivered.'''
+    def __init__(self, messageboard, name, wr, callback, maxlen):
+        self.messageboard = messageboard
+        self.wr = wr
+        self.callback = callback
+        self.queue = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.condition = Condition()
+        self.running = True
+        self.thread = Thread(None, self.__run, name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __call__(self, instance, message):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(message)
+            self.condition.notify()
+
+    def __run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                message = self.queue.popleft()
+            instance = self.wr()
+            if instance is None:
+                continue
+            try:
+                self.callback(instance, message)
+            except Exception as e:
+                self.messageboard.post('Exception', e)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not current_thread():
+            self.thread.join()
+
+class TimedCallback:
+    '''Callback which records its duration in a telemetry histogram.'''
+    def __init__(self, callback, histogram):
+        self.callback = callback
+        self.histogram = histogram
+
+    def __call__(self, instance, message):
+        start = timer()
+        try:
+            return self.callback(instance, message)
+        finally:
+            self.histogram.add(timer() - start)
+
+class DerivedValue:
+    '''Cached value of a derived heading. A post to one of the input headings
+    only marks the value as invalid; it is recomputed at the next query. If
+    "expiry" is given, expiry(instance, message) is the uptime after which
+    the value is stale also without a post, or None.'''
+    def __init__(self, wr, callback, message, expiry):
+        self.wr = wr
+        self.callback = callback
+        self.message = message
+        self.expiry = expiry
+        self.lock = Lock()
+        self.valid = False
+        self.value = None
+        self.expires = None
+        self.invalidations = 0
+        self.computations = 0
+        self.hits = 0
+
+    def invalidate(self):
+        self.valid = False
+        self.invalidations += 1
+
+    def get(self):
+        with self.lock:
+            if self.valid and (self.expires is None or
+                               Uptime() <= self.expires):
+                self.hits += 1
+            else:
+                instance = self.wr()
+                if instance is None:
+                    return None
+                # Mark as valid before the computation, so that an input
+                # which changes meanwhile triggers another computation.
+                self.valid = True
+                self.value = self.callback(instance, self.message)
+                if self.expiry is not None:
+                    self.expires = self.expiry(instance, self.message)
+                self.computations += 1
+            return self.value
+
+class MessageBoard:
+    '''Message board with copy-on-write subscription snapshots.
+
+    For each heading, the subscribers are stored as an immutable tuple of
+    (weak reference, callback) pairs. subscribe() and unsubscribe() build a
+    new tuple and replace the dictionary entry in a single assignment, so
+    post(), query() and ask() do not take a lock (except for computing a
+    derived value, see below). A callback which is
+    unsubscribed during a running post may still be called once from the
+    old snapshot.
+
+    With queued=True, messages are delivered to the subscriber by a
+    QueuedCallback instead of inline in the posting thread. This is meant for
+    slow subscribers to frequent messages like 'Time'. Do not use it for
+    headings which are queried with ask().
+
+    derive() declares a heading whose value is computed from other headings,
+    e.g. 'Average/60' from 'Measurement'. query() and ask() serve derived
+    headings from a cache which is invalidated by posts to the inputs and,
+    optionally, at an expiry uptime (when the oldest sample leaves the
+    window).
+
+    If "telemetry" is set (see telemetry.py), the callbacks which subscribe
+    afterwards record their durations per heading and subscriber. Queued
+    callbacks are timed in their worker thread.'''
+    def __init__(self):
+        self.messages = {}
+        self.subscriptions = {}
+        self.derived = {}
+        self.dependents = {}
+        self.subscriptionLock = Lock() # serializes writers only
+        self.telemetry = None
+
+    def post(self, heading, message):
+        self.messages[heading] = message
+        for wr, callback in self.subscriptions.get(heading, ()):
+            instance = wr()
+            if instance is not None:
+                callback(instance, message)
+        # Invalidate after the subscribers have been called since a derived
+        # value usually depends on their state.
+        for derived in self.dependents.get(heading, ()):
+            derived.invalidate()
+
+    def query(self, heading):
+        derived = self.derived.get(heading)
+        if derived is not None:
+            return derived.get()
+        return self.messages.get(heading)
+
+    def subscribe(self, heading, instance, callback, queued=False, maxlen=1):
+        with self.subscriptionLock:
+            snapshot = self.subscriptions.get(heading, ())
+            wr = weakref.ref(instance)
+            assert wr not in [w for w, c in snapshot]
+            if self.telemetry is not None:
+                histogram = self.telemetry.histogram('callback {} {}'.format(
+                    heading, getattr(instance, 'name',
+                                     type(instance).__name__)))
+                callback = TimedCallback(callback, histogram)
+            if queued:
+                name = '{}:{}'.format(getattr(instance, 'name', 'queue'), heading)
+                callback = QueuedCallback(self, name, wr, callback, maxlen)
+            self.subscriptions[heading] = snapshot + ((wr, callback),)
+
+    def derive(self, heading, instance, inputs, callback, message=None,
+               expiry=None):
+        '''The value of "heading" is callback(instance, message). It is
+        recomputed when one of the headings in "inputs" has been posted, or
+        after the uptime expiry(instance, message) if "expiry" is given.'''
+        with self.subscriptionLock:
+            assert heading not in self.derived
+            derived = DerivedValue(weakref.ref(instance), callback, message,
+                                   expiry)
+            for input in inputs:
+                self.dependents[input] = \
+                    self.dependents.get(input, ()) + (derived,)
+            self.derived[heading] = derived
+
+    def derivedStatistics(self):
+        '''Invalidations, computations and cache hits per derived heading.'''
+        return dict((heading, (d.invalidations, d.computations, d.hits))
+                    for heading, d in self.derived.items())
+
+    def __removeDerived(self, wr):
+        for heading, derived in list(self.derived.items()):
+            if derived.wr == wr:
+                del self.derived[heading]
+        for input, dependents in list(self.dependents.items()):
+            remaining = tuple(d for d in dependents if d.wr != wr)
+            if remaining:
+                self.dependents[input] = remaining
+            else:
+                del self.dependents[input]
+
+    def __remove(self, heading, wr):
+        snapshot = self.subscriptions[heading]
+        remaining = tuple((w, c) for w, c in snapshot if w != wr)
+        if remaining:
+            self.subscriptions[heading] = remaining
+        else:
+            del self.subscriptions[heading]
+        return [c for w, c in snapshot
+                if w == wr and isinstance(c, QueuedCallback)]
+
+    def unsubscribe(self, heading, instance):
+        queues = []
+        with self.subscriptionLock:
+            if heading in self.subscriptions:
+                queues = self.__remove(heading, weakref.ref(instance))
+        # Join the worker threads outside the lock: a callback which is still
+        # running might subscribe or unsubscribe itself.
+        for queue in queues:
+            queue.stop()
+
+    def unsubscribeAll(self, instance):
+        queues = []
+        with self.subscriptionLock:
+            wr = weakref.ref(instance)
+            for heading in list(self.subscriptions):
+                queues += self.__remove(heading, wr)
+            self.__removeDerived(wr)
+        for queue in queues:
+            queue.stop()
+
+    def ask(self, heading, message):
+        '''The answer of the first subscriber to "heading". A derived heading
+        takes no message (its message is fixed in derive()), so the value
+        is the same as from query().'''
+        derived = self.derived.get(heading)
+        if derived is not None:
+            if message is not None:
+                raise ValueError('Derived heading {} takes no message.'.
+                                 format(heading))
+            return derived.get()
+        for wr, callback in self.subscriptions.get(heading, ()):
+            instance = wr()
+            if instance is not None:
+                return callback(instance, message)
+
 messageboard = MessageBoard()
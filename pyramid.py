@@ -0,0 +1,166 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+import numpy as np
+
+from history import fields, insufficient
+from sht75 import Bunch
+
+NaN = float('NaN')
+
+class Level:
+    '''Aggregates (sum, count, min, max) in time buckets of fixed length.
+
+    Bucket number n covers the uptimes n * length <= uptime < (n+1) * length.
+    It is stored in slot n % capacity of the ring buffer; older buckets are
+    overwritten. Per slot, there are (T, rH, tau) for each sensor.'''
+    def __init__(self, length, capacity, sensors=2):
+        self.length = length
+        self.capacity = capacity
+        # Uptimes can be negative (samples from before a reboot, see
+        # history.py), so mark unused slots with the smallest number.
+        self.number = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)
+        self.sum = np.zeros((capacity, sensors, 3))
+        self.count = np.zeros((capacity, sensors), dtype=np.int32)
+        self.min = np.full((capacity, sensors, 3), np.inf, dtype=np.float32)
+        self.max = np.full((capacity, sensors, 3), -np.inf, dtype=np.float32)
+        self.latest = None
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.number, self.sum, self.count,
+                                      self.min, self.max))
+
+    def oldest(self):
+        '''Start uptime of the oldest bucket which is still stored.'''
+        if self.latest is None:
+            return 0
+        return (self.latest - self.capacity + 1) * self.length
+
+    def add(self, uptime, values, valid):
+        n = int(uptime // self.length)
+        slot = n % self.capacity
+        if self.number[slot] != n:
+            self.number[slot] = n
+            self.sum[slot] = 0
+            self.count[slot] = 0
+            self.min[slot] = np.inf
+            self.max[slot] = -np.inf
+        if self.latest is None or n > self.latest:
+            self.latest = n
+        values = values[valid]
+        self.sum[slot, valid] += values
+        self.count[slot, valid] += 1
+        self.min[slot, valid] = np.minimum(self.min[slot, valid], values)
+        self.max[slot, valid] = np.maximum(self.max[slot, valid], values)
+
+    def buckets(self, t0, t1):
+        '''Slots of the stored buckets between the uptimes t0 and t1. Both
+        must be multiples of the bucket length.'''
+        n = np.arange(int(t0 // self.length), int(t1 // self.length))
+        slots = n % self.capacity
+        return slots[self.number[slots] == n]
+
+class Pyramid:
+    '''Measurements aggregated at several time resolutions, for queries over
+    long time spans (days to months) with bounded memory.
+
+    Every sample is added to the current bucket of each level. A query is
+    split into at most two partial ranges per level (at the left and right
+    edge) plus one range at the coarsest level, so it costs O(levels) NumPy
+    reductions, whatever the time span.'''
+    def __init__(self, levels=((60, 2 * 1440),      # 1 min, 2 days
+                               (900, 14 * 96),      # 15 min, 2 weeks
+                               (3600, 62 * 24),     # 1 h, 2 months
+                               (86400, 2 * 366)),   # 1 day, 2 years
+                 interval=10, sensors=2):
+        self.interval = interval
+        self.sensors = sensors
+        self.levels = [Level(length, capacity, sensors)
+                       for length, capacity in levels]
+        for fine, coarse in zip(self.levels, self.levels[1:]):
+            assert coarse.length % fine.length == 0
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def append(self, message):
+        data = message[1:]
+        values = np.array([(S.T, S.rH, S.tau) for S in data])
+        valid = np.array([not S.Error for S in data])
+        for level in self.levels:
+            level.add(message[0], values, valid)
+
+    def ranges(self, t0, t1):
+        '''Split [t0, t1) into (level, start, end) ranges of whole buckets.
+        The beginning is rounded up to a bucket of the finest level which
+        still stores it, the end is rounded up to the finest level.'''
+        start = [level for level in self.levels if level.oldest() <= t0]
+        if not start:
+            start = self.levels[-1:]
+            t0 = max(t0, start[0].oldest())
+        t0 = -(-t0 // start[0].length) * start[0].length
+        t1 = -(-t1 // self.levels[0].length) * self.levels[0].length
+        result = []
+        # Below the start level, t0 is aligned to the coarser buckets, so the
+        # left partial ranges are empty.
+        for level, coarser in zip(self.levels, self.levels[1:] + [None]):
+            if coarser is not None:
+                c0 = -(-t0 // coarser.length) * coarser.length
+                c1 = t1 // coarser.length * coarser.length
+                if c0 < c1:
+                    if t0 < c0:
+                        result.append((level, t0, c0))
+                    if c1 < t1:
+                        result.append((level, c1, t1))
+                    t0, t1 = c0, c1
+                    continue
+            result.append((level, t0, t1))
+            break
+        return result
+
+    def summary(self, uptime0, timespan):
+        '''Mean, minimum, maximum and number of samples per sensor and field
+        over the last "timespan" seconds before "uptime0".'''
+        shape = (self.sensors, 3)
+        total = np.zeros(shape)
+        count = np.zeros(self.sensors, dtype=np.int64)
+        minimum = np.full(shape, np.inf)
+        maximum = np.full(shape, -np.inf)
+        for level, t0, t1 in self.ranges(uptime0 - timespan, uptime0):
+            slots = level.buckets(t0, t1)
+            if len(slots):
+                total += level.sum[slots].sum(axis=0)
+                count += level.count[slots].sum(axis=0)
+                minimum = np.minimum(minimum, level.min[slots].min(axis=0))
+                maximum = np.maximum(maximum, level.max[slots].max(axis=0))
+        result = []
+        for sensor in range(self.sensors):
+            n = int(count[sensor])
+            values = {}
+            for j, field in enumerate(fields):
+                values[field] = float(total[sensor, j]) / n if n else NaN
+                values[field + 'min'] = float(minimum[sensor, j]) if n else NaN
+                values[field + 'max'] = float(maximum[sensor, j]) if n else NaN
+            result.append(Bunch(count = n,
+                                Error = insufficient(n, timespan,
+                                                     self.interval),
+                                **values))
+        return tuple(result)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Sensor registry: the sensors from fancontrol.cfg, section [sensors], in
+    the order given there. Each line is "name = clock pin, data pin" with
+    an optional label for the web page as a third field:
+
+    [sensors]
+    indoor = 7, 11
+    outdoor = 13, 15
+    attic = 16, 18, Attic
+
+    The default label of "indoor" and "outdoor" is "Indoors" and
+    "Outdoors", else the name.
+
+    Without this section, the sensors are "indoor" and "outdoor" with the
+    pins sensor1_* and sensor2_* from section [pins].
+
+    The fan control compares the sensors named by "indoor" and "outdoor" in
+    section [fan] (default: the first and the second sensor). The display
+    and the live web page show these two.
+'''
+from collections import namedtuple
+
+from configuration import config
+
+SensorSpec = namedtuple('SensorSpec', ('name', 'clock', 'data', 'label'))
+
+defaultLabels = {'indoor': u'Indoors', 'outdoor': u'Outdoors'}
+
+def _read_sensors():
+    if config.has_section('sensors'):
+        sensors = []
+        for name, value in config.items('sensors'):
+            fields = [field.strip() for field in value.split(',', 2)]
+            clock, data = int(fields[0]), int(fields[1])
+            label = fields[2] if len(fields) > 2 else \
+                defaultLabels.get(name, name)
+            if not isinstance(label, type(u'')): # Python 2
+                label = label.decode('utf-8')
+            sensors.append(SensorSpec(name, clock, data, label))
+    else:
+        sensors = [SensorSpec(name,
+                              config.getint('pins', prefix + '_clock'),
+                              config.getint('pins', prefix + '_data'),
+                              defaultLabels[name])
+                   for name, prefix in (('indoor', 'sensor1'),
+                                        ('outdoor', 'sensor2'))]
+    # The sensors are read concurrently, see sht75.read_concurrently.
+    pins = [pin for sensor in sensors for pin in (sensor.clock, sensor.data)]
+    if len(set(pins)) != len(pins):
+        raise ValueError('The sensors must be on independent pins: {}'.
+                         format(sensors))
+    return sensors
+
+def _index(option, default):
+    if config.has_option('fan', option):
+        return names.index(config.get('fan', option))
+    return default
+
+sensors = _read_sensors()
+names = [sensor.name for sensor in sensors]
+labels = [sensor.label for sensor in sensors]
+pins = [(sensor.clock, sensor.data) for sensor in sensors]
+indoor = _index('indoor', 0)
+outdoor = _index('outdoor', 1)
+assert len(sensors) >= 2 and indoor != outdoor
@@ -0,0 +1,190 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Central scheduler for periodic and one-shot jobs. The main thread runs
+    the jobs when they are due and sleeps until the next one, so there is
+    no fixed tick.
+
+    A periodic job is due "phase" seconds after a full multiple of its
+    period on the wall clock, e.g. 250 ms after the full second to keep the
+    sensor readout away from the DCF77 pulses. The phase is realigned at
+    every run, so it follows steps of the system clock (date -s by the DCF77
+    receiver, NTP). A job which is more than
+    "deadline" seconds late is skipped. Per job, the scheduler counts the
+    runs, the lateness (mean and maximum), the deadline misses and the
+    overruns (periods skipped because the job or the scheduler was busy).
+    The distributions of the lateness and of the callback durations go to
+    the telemetry histograms (telemetry.py).
+
+    The callbacks run in the scheduler thread and must be short: they
+    usually post a message or wake a worker thread.
+'''
+import logging
+from threading import Condition
+from timeit import default_timer as timer
+
+import uptime
+from telemetry import telemetry
+from uptime import Time, Uptime
+
+logger = logging.getLogger('fancontrol')
+
+class Job:
+    def __init__(self, name, owner, callback, period, phase, deadline, due):
+        self.name = name
+        self.owner = owner
+        self.callback = callback
+        self.period = period # None: one-shot
+        self.phase = phase
+        self.deadline = deadline
+        self.due = due
+        self.runs = 0
+        self.lateness = 0.0 # sum
+        self.maxLateness = 0.0
+        self.misses = 0
+        self.overruns = 0
+
+    def statistics(self):
+        return dict(runs = self.runs,
+                    lateness = self.lateness / self.runs if self.runs else 0.0,
+                    maxLateness = self.maxLateness,
+                    misses = self.misses,
+                    overruns = self.overruns)
+
+class Scheduler:
+    '''Jobs are kept in a list, and the earliest due time is found by a
+    scan: with a handful of jobs, this is cheaper than a heap or a timer
+    wheel.'''
+    def __init__(self):
+        self.jobs = []
+        self.condition = Condition()
+
+    def periodic(self, name, owner, callback, period, phase=0.0,
+                 deadline=None):
+        '''Run callback(owner, uptime) every "period" seconds.'''
+        now = Uptime()
+        # Wall-clock time of the next full multiple of the period + phase.
+        offset = Time() - now
+        due = now + (phase - (now + offset)) % period
+        return self.__add(Job(name, owner, callback, period, phase, deadline,
+                              due))
+
+    def once(self, name, owner, callback, delay, deadline=None):
+        '''Run callback(owner, uptime) once after "delay" seconds.'''
+        return self.__add(Job(name, owner, callback, None, 0.0, deadline,
+                              Uptime() + delay))
+
+    def __add(self, job):
+        with self.condition:
+            self.jobs.append(job)
+            self.condition.notify()
+        return job
+
+    def setPeriod(self, job, period):
+        '''Change the period. The next run is one new period after the
+        previous due time.'''
+        with self.condition:
+            if job.period != period:
+                job.due += period - job.period
+                job.period = period
+                self.condition.notify()
+
+    def cancel(self, job):
+        with self.condition:
+            if job in self.jobs:
+                self.jobs.remove(job)
+
+    def cancelAll(self, owner):
+        with self.condition:
+            self.jobs = [job for job in self.jobs if job.owner is not owner]
+
+    def statistics(self):
+        '''Statistics per job name (see Job.statistics).'''
+        with self.condition:
+            return dict((job.name, job.statistics()) for job in self.jobs)
+
+    def logStatistics(self, uptime=None):
+        for name, s in sorted(self.statistics().items()):
+            logger.info('Scheduler: {}: {} runs, lateness mean {:.3f}s, '
+                        'max {:.3f}s, {} deadline misses, {} overruns.'.
+                        format(name, s['runs'], s['lateness'],
+                               s['maxLateness'], s['misses'], s['overruns']))
+
+    def next(self, timeout=1.0):
+        '''Wait until a job is due. Returns (job, due time, uptime), or
+        None after "timeout" seconds.'''
+        with self.condition:
+            end = Uptime() + timeout
+            while True:
+                now = Uptime()
+                job = min(self.jobs, key=lambda job: job.due) \
+                    if self.jobs else None
+                if job is not None and job.due <= now:
+                    due = job.due
+                    self.__reschedule(job, now)
+                    return job, due, now
+                wait = end - now
+                if job is not None:
+                    wait = min(wait, job.due - now)
+                if wait <= 0:
+                    return None
+                # In real seconds, also under a virtual clock (uptime.py).
+                speed = getattr(uptime.clock, 'speed', 1.0)
+                self.condition.wait(wait / speed)
+
+    def __reschedule(self, job, now):
+        if job.period is None:
+            self.jobs.remove(job)
+            return
+        job.due += job.period
+        if job.due <= now:
+            skipped = int((now - job.due) // job.period) + 1
+            job.overruns += skipped
+            job.due += skipped * job.period
+        # Realign to the wall clock, which may have been stepped: move the
+        # due time by at most half a period to the next multiple + phase.
+        offset = Time() - now
+        half = .5 * job.period
+        job.due += (job.phase - (job.due + offset) + half) % job.period - half
+        if job.due <= now:
+            job.due += job.period
+
+    def runPending(self, timeout=1.0):
+        '''Wait up to "timeout" seconds for a job to become due, then run
+        all due jobs.'''
+        item = self.next(timeout)
+        while item is not None:
+            job, due, now = item
+            lateness = now - due
+            if job.deadline is not None and lateness > job.deadline:
+                job.misses += 1
+                logger.warning('Scheduler: {} skipped, {:.3f}s late.'.
+                               format(job.name, lateness))
+            else:
+                job.runs += 1
+                job.lateness += lateness
+                job.maxLateness = max(job.maxLateness, lateness)
+                telemetry.add('lateness ' + job.name, lateness)
+                start = timer()
+                job.callback(job.owner, now)
+                telemetry.add('job ' + job.name, timer() - start)
+            item = self.next(0)
+
+scheduler = Scheduler()
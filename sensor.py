@@ -17,31 +17,37 @@
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
-import sys
-if sys.hexversion < 0x03000000:
-    from ConfigParser import RawConfigParser
-else:
-    from configparser import RawConfigParser
-from datetime import datetime
 import logging
 from threading import Event
-import time
+from timeit import default_timer as timer
 
+from acquisition import Acquisition, threadCPUTime
 from component import ComponentWithThread
+from configuration import config
+import registry
 import sht75
-from uptime import Uptime
+from telemetry import telemetry
+from uptime import Time
 
 logger = logging.getLogger('fancontrol')
 
-config = RawConfigParser()
-config.read('fancontrol.cfg')
-clock1 = config.getint('pins', 'sensor1_clock')
-data1 = config.getint('pins', 'sensor1_data')
-clock2 = config.getint('pins', 'sensor2_clock')
-data2 = config.getint('pins', 'sensor2_data')
-
 measure_interval = config.getint('measure', 'interval')
-assert measure_interval >= 1
+min_interval = config.getint('measure', 'min_interval') \
+    if config.has_option('measure', 'min_interval') else measure_interval
+max_interval = config.getint('measure', 'max_interval') \
+    if config.has_option('measure', 'max_interval') else measure_interval
+resolution = config.get('measure', 'resolution') \
+    if config.has_option('measure', 'resolution') else None
+# Read the sensors in a separate process, see acquisition.py.
+acquisition_process = config.getboolean('measure', 'process') \
+    if config.has_option('measure', 'process') else False
+assert 1 <= min_interval <= measure_interval <= max_interval
+
+# Adaptive measurement interval
+fan_threshold = 1.0 # K, minimal dew point difference in Fan.decideFan
+threshold_margin = 2.0 # K
+stable_change = 0.1 # K per interval
+fast_change = 0.5 # K per interval
 
 class csv:
     def __init__(self, *args):
@@ -50,50 +56,111 @@ class csv:
     def __str__(self):
         return ','.join(map(str, self.args))
 
-def delay(seconds):
-    time0 = Uptime()
-    sleeptime = seconds
-    while sleeptime > 0:
-        time.sleep(sleeptime)
-        time1 = Uptime()
-        sleeptime = seconds - time1 + time0
+class AdaptiveInterval:
+    '''Interval between measurements.
+
+    The interval is doubled while the readings are stable and halved when
+    they change quickly, between "min_interval" and "max_interval". While
+    the dew point difference is close to the threshold of the fan control,
+    the minimal interval is used. After a sensor error, the interval falls
+    back to the nominal one.
+
+    "indoor" and "outdoor" are the indices of the sensors which the fan
+    control compares.'''
+    def __init__(self, interval, min_interval, max_interval, indoor=0,
+                 outdoor=1):
+        self.nominal = interval
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.indoor = indoor
+        self.outdoor = outdoor
+        self.last = None
+
+    def update(self, uptime, data):
+        '''Adapt the interval to a new measurement (one Bunch per sensor)
+        and return it.'''
+        if any(S.Error for S in data):
+            self.last = None
+            self.interval = min(self.interval, self.nominal)
+            return self.interval
+        values = [v for S in data for v in (S.T, S.tau)]
+        interval = self.interval
+        if self.last is not None and uptime > self.last[0]:
+            uptime0, values0 = self.last
+            # Largest change, extrapolated to the current interval
+            change = max(abs(v - v0) for v, v0 in zip(values, values0)) \
+                * interval / (uptime - uptime0)
+            if change > fast_change:
+                interval //= 2
+            elif change < stable_change:
+                interval *= 2
+        difference = data[self.indoor].tau - data[self.outdoor].tau
+        if abs(difference - fan_threshold) < threshold_margin:
+            interval = self.min_interval
+        self.interval = max(self.min_interval, min(self.max_interval, interval))
+        self.last = (uptime, values)
+        return self.interval
 
 class Sensor(ComponentWithThread):
     def __init__(self):
         ComponentWithThread.__init__(self, 'sensor')
-        self.S1 = sht75.Sensor(clock1, data1)
-        self.S2 = sht75.Sensor(clock2, data2)
+        if acquisition_process:
+            self.acquisition = Acquisition(registry.pins, resolution)
+        else:
+            self.acquisition = None
+            self.sensors = [sht75.Sensor(clock, data, resolution)
+                            for clock, data in registry.pins]
         self.event = Event()
-        self.lastmeasurement = Uptime()
+        self.interval = AdaptiveInterval(measure_interval, min_interval,
+                                         max_interval, registry.indoor,
+                                         registry.outdoor)
 
     def __enter__(self):
-        self.messageboard.subscribe('Time', self, Sensor.onTime)
+        # Measure 250 ms after the full second. This lowers interference
+        # with the DCF77 receiver.
+        self.job = self.scheduler.periodic('measurement', self,
+                                           Sensor.onSchedule,
+                                           self.interval.interval, phase = .25)
+        # The first measurement does not wait for the period, since the fan
+        # is not controlled before.
+        self.scheduler.once('first measurement', self, Sensor.onSchedule,
+                            (.25 - Time()) % 1.0)
         return ComponentWithThread.__enter__(self)
 
-    def onTime(self, message):
-        self.uptime, localtime = message
-        if self.uptime > self.lastmeasurement + 10.5:
-            logger.warning('Interval between measurements > 10.5s: {}, {}.'.
-                           format(self.lastmeasurement, self.uptime))
-        if int(self.uptime) % measure_interval == 0 \
-           or self.uptime > self.lastmeasurement + 10.5:
-            self.lastmeasurement = self.uptime
-            self.event.set()
+    def __exit__(self, exc_type, exc_value, traceback):
+        ComponentWithThread.__exit__(self, exc_type, exc_value, traceback)
+        if self.acquisition is not None:
+            self.acquisition.stop()
+
+    def onSchedule(self, uptime):
+        self.uptime = uptime
+        self.event.set()
 
     def run(self):
         while self.messageboard.query('ExitThread') is None:
             if self.event.wait(1):
                 self.event.clear()
-                # Start measurement approx. 250 ms after the full second.
-                # This lowers interference with the DCF77 receiver.
-                microsecond = datetime.now().microsecond
-                wait = ((1250000 - microsecond) % 1000000) / 1000000.0
-                assert wait >= 0
-                assert wait < 1
-                delay(wait)
-                S1Data = self.S1.read()
-                S2Data = self.S2.read()
-                self.messageboard.post('Measurement', (self.uptime, S1Data, S2Data))
+                start = timer()
+                if self.acquisition is None:
+                    # All sensors convert at the same time.
+                    cputime = threadCPUTime()
+                    data, latencies = sht75.read_concurrently(self.sensors)
+                    cputime = threadCPUTime() - cputime
+                else:
+                    data, latencies, cputime = self.acquisition.measure()
+                telemetry.add('sensor read', timer() - start)
+                # Measurement: (uptime, data of sensor 1, ..., sensor n) in
+                # the order of the sensor registry.
+                self.messageboard.post('Measurement',
+                                       (self.uptime,) + tuple(data))
+                self.messageboard.post('ConversionTime', latencies)
+                self.messageboard.post('MeasurementCPUTime', cputime)
+                interval = self.interval.update(self.uptime, data)
+                self.messageboard.post('MeasurementInterval', interval)
+                self.scheduler.setPeriod(self.job, interval)
                 logger.info(csv('measurement',
-                                S1Data.rH, S1Data.T, S1Data.tau, S1Data.Error,
-                                S2Data.rH, S2Data.T, S2Data.tau, S2Data.Error))
+                                *[v for S in data
+                                  for v in (S.rH, S.T, S.tau, S.Error)]))
+            elif self.acquisition is not None:
+                self.acquisition.supervise()
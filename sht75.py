@@ -26,15 +26,20 @@ from __future__ import print_function
 import logging
 import math
 import sys
+import threading
 import time
-import RPi.GPIO as GPIO
+from timeit import default_timer as timer
 from numpy import interp
 
-from uptime import Uptime
+from gpio import GPIO
+from uptime import Uptime, monotonic
+if monotonic is None:
+    monotonic = Uptime
 
 logger = logging.getLogger('fancontrol')
 
 DEBUG = False
+EDGE_WAIT = True # False: old busy wait, for comparison
 
 class ShtFailure(Exception):
     def __init__(self, value):
@@ -46,10 +51,19 @@ class ShtFailure(Exception):
 class ShtCommFailure(ShtFailure): pass
 class ShtCRCCheckError(ShtFailure): pass
 
-wait_short = 0.0000001 # 100ns, not sure if actually makes a difference
+half_period = 0.0000005 # 500ns: SCK max. 1MHz at VDD < 4.5V (Table 5)
+poll_interval = 0.005 # upper bound for the reaction time if an edge is missed
+_no_edge_detect = set() # pins where edge detection failed
+
+def _spin(seconds):
+    '''Busy wait for sub-microsecond delays, where time.sleep would cost a
+    system call of several ten microseconds.'''
+    t1 = timer() + seconds
+    while timer() < t1:
+        pass
 
 class ShtComms(object):
-    def _crc8(self, cmd, v0, v1, _crc_table=[
+    def _crc8(self, data, init=0, _crc_table=[
             0x00, 0x31, 0x62, 0x53, 0xc4, 0xf5, 0xa6, 0x97, 0xb9, 0x88, 0xdb, 0xea,
             0x7d, 0x4c, 0x1f, 0x2e, 0x43, 0x72, 0x21, 0x10, 0x87, 0xb6, 0xe5, 0xd4,
             0xfa, 0xcb, 0x98, 0xa9, 0x3e, 0x0f, 0x5c, 0x6d, 0x86, 0xb7, 0xe4, 0xd5,
@@ -74,9 +88,9 @@ class ShtComms(object):
             0xff, 0xce, 0x9d, 0xac ]):
         # See: http://www.sensirion.com/nc/en/products/\
         #  humidity-temperature/download-center/?cid=884&did=124&sechash=5c5f91f6
-        crc = _crc_table[cmd]
-        crc = _crc_table[crc ^ v0]
-        crc = _crc_table[crc ^ v1]
+        crc = init
+        for v in data:
+            crc = _crc_table[crc ^ v]
         # Reverse bit order
         # See: http://graphics.stanford.edu/~seander/bithacks.html#ReverseByteWith64BitsDiv
         return (crc * 0x0202020202 & 0x010884422010) % 1023
@@ -84,29 +98,52 @@ class ShtComms(object):
     def __init__(self, pin_sck, pin_data):
         self.pin_sck, self.pin_data = pin_sck, pin_data
         GPIO.setup((self.pin_sck, self.pin_data), GPIO.OUT)
+        self._data_direction = 'out'
+        self._delay = 0
+        self._crc_init = 0
         self.reset_connection()
 
     def __del__(self):
         GPIO.cleanup([self.pin_sck, self.pin_data])
 
+    # The direction of the data pin is remembered, so that GPIO.setup is only
+    # called when it changes.
+    def _data_output(self):
+        if self._data_direction != 'out':
+            GPIO.setup(self.pin_data, GPIO.OUT)
+            self._data_direction = 'out'
+
+    def _data_input(self):
+        if self._data_direction != 'in':
+            GPIO.setup(self.pin_data, GPIO.IN, GPIO.PUD_UP)
+            self._data_direction = 'in'
+
     def _data_set(self, v):
-        GPIO.setup(self.pin_data, GPIO.OUT)
+        self._data_output()
         GPIO.output(self.pin_data, v)
-        time.sleep(wait_short)
+        if self._delay:
+            _spin(self._delay)
 
     def _data_get(self):
         return GPIO.input(self.pin_data)
 
     def _sck_tick(self, v):
         GPIO.output(self.pin_sck, v)
-        time.sleep(wait_short)
+        if self._delay:
+            _spin(self._delay)
 
     def reset_connection(self):
         tick, data = self._sck_tick, self._data_set
+        self._data_direction = None
+        self._delay = 0
         data(1)
+        t0 = timer()
         for ii in xrange(9):
             tick(0)
             tick(1)
+        # A GPIO call from Python usually takes longer than the minimal clock
+        # half period, so that no extra delay is needed.
+        self._delay = max(0, half_period - (timer() - t0) / 18)
         try:
             self._send(0b00011100)
             self._wait()
@@ -124,45 +161,47 @@ class ShtComms(object):
         tick(1)
         data(1)
 
-    def _send(self, cmd):
-        tick, data = self._sck_tick, self._data_set
+    def _send(self, cmd, release=True):
         self._transmission_start()
+        self._write_byte(cmd, release)
+
+    def _write_byte(self, v, release=True):
+        '''"release": the sensor releases the data line after the ACK. Not so
+        if it sends data right away (status register read).'''
+        tick, data = self._sck_tick, self._data_set
         tick(0)
         for n in xrange(8):
-            data(cmd & (1 << 7 - n))
+            data(v & (1 << 7 - n))
             tick(1)
             tick(0)
 
-        GPIO.setup(self.pin_data, GPIO.IN, GPIO.PUD_UP)
+        self._data_input()
         tick(1)
         if self._data_get():
             raise ShtCommFailure('Command ACK failed on step 1.')
         tick(0)
-        if not self._data_get():
+        if release and not self._data_get():
             raise ShtCommFailure('Command ACK failed on step 2.')
 
     def _wait(self):
-        GPIO.setup(self.pin_data, GPIO.IN, GPIO.PUD_UP)
-        #try:
-        #    channel = GPIO.wait_for_edge(self.pin_data, GPIO.FALLING, timeout=1000)
-        #except RuntimeError as error:
-        #    raise ShtCommFailure(*error.args)
-        #if channel is None:
-        #    raise ShtCommFailure('Wait timeout')
-
-        # Busy wait... more reliable
-        t0 = Uptime()
-        while self._data_get():
-            if Uptime() - t0 > 1:
+        self._data_input()
+        for i, latency in _wait_ready([self], [monotonic()]):
+            if latency is None:
                 raise ShtCommFailure('Wait timeout')
 
     def _read_bits(self, bits, v=0):
-        tick = self._sck_tick
-        GPIO.setup(self.pin_data, GPIO.IN, GPIO.PUD_UP)
+        self._data_input()
+        # Tight loop with local names: this runs for every bit.
+        output, input = GPIO.output, GPIO.input
+        pin_sck, pin_data, delay = self.pin_sck, self.pin_data, self._delay
         for n in xrange(bits):
-            tick(1)
-            v = (v << 1) + self._data_get()
-            tick(0)
+            output(pin_sck, 1)
+            if delay:
+                _spin(delay)
+            v = (v << 1) | input(pin_data)
+            output(pin_sck, 0)
+            if delay:
+                _spin(delay)
         return v
 
     def _read_meas_16bit(self):
@@ -181,9 +220,20 @@ class ShtComms(object):
     def _get_meas_result(self, cmd):
         self._send(cmd)
         self._wait()
+        return self._finish_meas(cmd)
+
+    def _start_meas(self, cmd):
+        self._send(cmd)
+        self._data_input()
+
+    def _ready(self):
+        '''The sensor pulls the data line low when the conversion is done.'''
+        return not self._data_get()
+
+    def _finish_meas(self, cmd):
         v0, v1 = self._read_meas_16bit()
         # self._skip_crc()
-        crc0, crc1 = self._crc8(cmd, v0, v1), self._read_crc()
+        crc0, crc1 = self._crc8((cmd, v0, v1), self._crc_init), self._read_crc()
         if crc0 != crc1:
             raise ShtCRCCheckError('Checksum error: {} != {}.'.
                                    format(crc0, crc1))
@@ -222,22 +272,90 @@ class Sht(ShtComms):
         tn = dict(water=243.12, ice=272.62) # Table 9
         m = dict(water=17.62, ice=22.46) # Table 9
 
+    class c_low(c):
+        # Low resolution, status register bit 0 set.
+        d2 = 0.04 # Table 8, C/12b
+        c1, c2, c3 = -2.0468, 0.5872, -4.0845e-4 # Table 6, 8b
+        t1, t2 = 0.01, 0.00128 # Table 7, 8b
+
     class cmd:
         t = 0b00000011
         rh = 0b00000101
+        status_write = 0b00000110
+        status_read = 0b00000111
         soft_reset = 0b00011110
 
-    def __init__(self, pin_sck, pin_data, voltage=None, **sht_comms_kws):
+    status_low_resolution = 0b00000001 # 12b T, 8b RH (ch 3.6)
+    status_writable = 0b00000111
+
+    def __init__(self, pin_sck, pin_data, voltage=None, resolution=None,
+                 **sht_comms_kws):
         '''"voltage" setting is important,
            as it influences temperature conversion coefficients!!!
            Unless you're using SHT1x/SHT7x, please make
-           sure all coefficients match your sensor's datasheet.'''
+           sure all coefficients match your sensor's datasheet.
+
+           "resolution": 'high' (14 bit T, 12 bit RH, the default of the
+           sensor) or 'low' (12 bit T, 8 bit RH, conversions about 4 times
+           faster). It is written to the status register and verified at
+           every connection reset. None leaves the status register alone.'''
+        if resolution not in (None, 'high', 'low'):
+            raise ValueError('Resolution must be "high" or "low": {}'.
+                             format(resolution))
         self.voltage = voltage or self.voltage_default
         self.d1 = self.c.compute_d1(self.voltage)
+        self.resolution = resolution
         super(Sht, self).__init__(pin_sck, pin_data, **sht_comms_kws)
 
+    def reset_connection(self):
+        super(Sht, self).reset_connection()
+        if self.resolution is not None:
+            try:
+                self._set_resolution(self.resolution == 'low')
+            except (ShtCommFailure, ShtCRCCheckError) as e:
+                logger.error('Error, setting the resolution failed, {}'.
+                             format(e))
+
+    def _set_resolution(self, low):
+        status = self._read_status()
+        if bool(status & self.status_low_resolution) != low:
+            status &= self.status_writable & ~self.status_low_resolution
+            if low:
+                status |= self.status_low_resolution
+            self._write_status(status)
+            status = self._read_status()
+        # The conversion coefficients follow the actual state of the sensor.
+        actual = bool(status & self.status_low_resolution)
+        self.c = self.c_low if actual else Sht.c
+        if actual != low:
+            logger.error('Error, resolution is {}.'.
+                         format('low' if actual else 'high'))
+
+    def _read_status(self):
+        '''The sensor sends the status register right after the command ACK.
+        The CRC starts with the lower nibble of the status register in
+        reversed bit order, so this also sets it for the measurements.'''
+        cmd = self.cmd.status_read
+        self._send(cmd, release=False)
+        status = self._read_bits(8)
+        crc1 = self._read_crc()
+        init = ((status & 1) << 7 | (status & 2) << 5 | (status & 4) << 3
+                | (status & 8) << 1)
+        crc0 = self._crc8((cmd, status), init)
+        if crc0 != crc1:
+            raise ShtCRCCheckError('Checksum error: {} != {}.'.
+                                   format(crc0, crc1))
+        self._crc_init = init
+        return status
+
+    def _write_status(self, status):
+        self._send(self.cmd.status_write)
+        self._write_byte(status)
+
     def read_t(self):
-        t_raw = self._get_meas_result(self.cmd.t)
+        return self._convert_t(self._get_meas_result(self.cmd.t))
+
+    def _convert_t(self, t_raw):
         return t_raw * self.c.d2 + self.d1
 
     def read_rh(self, t=None):
@@ -245,7 +363,9 @@ class Sht(ShtComms):
         return self._read_rh(t)
 
     def _read_rh(self, t):
-        rh_raw = self._get_meas_result(self.cmd.rh)
+        return self._convert_rh(self._get_meas_result(self.cmd.rh), t)
+
+    def _convert_rh(self, rh_raw, t):
         rh_linear = self.c.c1 + self.c.c2 * rh_raw + self.c.c3 * rh_raw**2 # ch 4.1
         return (t - 25.0) * (self.c.t1 + self.c.t2 * rh_raw) + rh_linear # ch 4.2
 
@@ -271,8 +391,8 @@ class Bunch:
         return str(self.__dict__)
 
 class Sensor:
-    def __init__(self, clock, data):
-        self.sht = Sht(clock, data, voltage = 3.3)
+    def __init__(self, clock, data, resolution=None):
+        self.sht = Sht(clock, data, voltage = 3.3, resolution = resolution)
         self.rH = NaN
         self.T = NaN
         self.tau = NaN
@@ -284,9 +404,128 @@ class Sensor:
             self.tau = self.sht.read_dew_point(self.T, self.rH)
             self.Error = False
         except (ShtCommFailure, ShtCRCCheckError) as e:
-            logger.warning('Error, {}'.format(e))
-            self.sht.reset_connection()
-            self.T, self.rH, self.tau = NaN, NaN, NaN
-            self.Error = True
+            self.fail(e)
 
         return Bunch(rH = self.rH, T = self.T, tau = self.tau, Error = self.Error)
+
+    def fail(self, e):
+        logger.warning('Error, {}'.format(e))
+        self.sht.reset_connection()
+        self.T, self.rH, self.tau = NaN, NaN, NaN
+        self.Error = True
+
+def _wait_ready(shts, start, timeout=1):
+    '''Wait until the sensors have finished their conversions, i.e. pulled
+    their data lines low. start[i] is the monotonic time when the command was
+    sent to shts[i].
+
+    Yields (index, conversion time) as soon as a sensor is ready, or
+    (index, None) on timeout. The thread sleeps until a falling edge is
+    detected. Since an edge can be missed (e.g. if it comes before the edge
+    detection is set up), the data lines are also polled every
+    "poll_interval" seconds; if edge detection is not available, this
+    bounded polling is all that remains.
+
+    With EDGE_WAIT = False, this is the former busy wait.'''
+    event = threading.Event()
+    def onEdge(channel):
+        event.set()
+    pending = {}
+    for i, sht in enumerate(shts):
+        pending[i] = sht
+        sht._edge_detect = False
+        if EDGE_WAIT and sht.pin_data not in _no_edge_detect:
+            try:
+                GPIO.add_event_detect(sht.pin_data, GPIO.FALLING,
+                                      callback=onEdge)
+                sht._edge_detect = True
+            except RuntimeError as e:
+                logger.warning('Sensor: no edge detection on pin {}, {}'.
+                               format(sht.pin_data, e))
+                _no_edge_detect.add(sht.pin_data)
+    try:
+        while pending:
+            event.clear()
+            for i in list(pending):
+                sht = pending[i]
+                now = monotonic()
+                if sht._ready():
+                    del pending[i]
+                    _remove_edge_detect(sht)
+                    yield i, now - start[i]
+                elif now - start[i] > timeout:
+                    del pending[i]
+                    _remove_edge_detect(sht)
+                    yield i, None
+            if pending and EDGE_WAIT:
+                event.wait(poll_interval)
+    finally:
+        for sht in pending.values():
+            _remove_edge_detect(sht)
+
+def _remove_edge_detect(sht):
+    # Before the data is clocked out, which causes further edges.
+    if sht._edge_detect:
+        GPIO.remove_event_detect(sht.pin_data)
+        sht._edge_detect = False
+
+def _measure_concurrently(shts, cmd, timeout=1):
+    '''Start the measurement "cmd" on all sensors, then wait for the data
+    lines and read each result as soon as its conversion is done.
+
+    Returns a list of (raw value or exception, conversion time) pairs.'''
+    results = [(None, NaN)] * len(shts)
+    started = []
+    start = []
+    for i, sht in enumerate(shts):
+        try:
+            sht._start_meas(cmd)
+            started.append(i)
+            start.append(monotonic())
+        except ShtCommFailure as e:
+            results[i] = (e, NaN)
+    for j, latency in _wait_ready([shts[i] for i in started], start, timeout):
+        i = started[j]
+        if latency is None:
+            results[i] = (ShtCommFailure('Wait timeout'), NaN)
+            continue
+        try:
+            results[i] = (shts[i]._finish_meas(cmd), latency)
+        except (ShtCommFailure, ShtCRCCheckError) as e:
+            results[i] = (e, latency)
+    return results
+
+def read_concurrently(sensors):
+    '''Read several sensors on independent pins at the same time: each
+    command is sent to all sensors, so that the conversions overlap.
+
+    Returns the measurements (like Sensor.read) and the conversion times
+    (temperature, humidity) in seconds for each sensor.'''
+    shts = [sensor.sht for sensor in sensors]
+    latencies = [(NaN, NaN)] * len(sensors)
+    failed = {}
+    for i, (t_raw, latency) in enumerate(
+            _measure_concurrently(shts, Sht.cmd.t)):
+        latencies[i] = (latency, NaN)
+        if isinstance(t_raw, Exception):
+            failed[i] = t_raw
+        else:
+            sensors[i].T = shts[i]._convert_t(t_raw)
+    ok = [i for i in range(len(sensors)) if i not in failed]
+    for i, (rh_raw, latency) in zip(
+            ok, _measure_concurrently([shts[i] for i in ok], Sht.cmd.rh)):
+        latencies[i] = (latencies[i][0], latency)
+        if isinstance(rh_raw, Exception):
+            failed[i] = rh_raw
+        else:
+            sensor = sensors[i]
+            sensor.rH = shts[i]._convert_rh(rh_raw, sensor.T)
+            sensor.tau = shts[i].read_dew_point(sensor.T, sensor.rH)
+            sensor.Error = False
+    result = []
+    for i, sensor in enumerate(sensors):
+        if i in failed:
+            sensor.fail(failed[i])
+        result.append(Bunch(rH = sensor.rH, T = sensor.T, tau = sensor.tau,
+                            Error = sensor.Error))
+    return result, latencies
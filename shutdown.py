@@ -17,9 +17,8 @@
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 '''
-import dbus
-
 def shutdown():
+    import dbus
     # http://stackoverflow.com/a/41644926
     sys_bus = dbus.SystemBus()
     lg = sys_bus.get_object('org.freedesktop.login1','/org/freedesktop/login1')
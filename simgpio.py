@@ -0,0 +1,472 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Simulated GPIO: a drop-in replacement for RPi.GPIO with emulated
+    hardware, so that the controller runs (and can be profiled) without a
+    Raspberry Pi. See gpio.py for how it is selected.
+
+    - SHT75 sensors with the full bus protocol, whose readings follow a
+      climate trace (see ClimateTrace),
+    - a DCF77 receiver which sends the pulse train of the system time, from
+      the setup of its pin until the cleanup or the exit,
+    - relays and the LED: output pins which keep their level,
+    - buttons: input pins with pull-up, see SimulatedGPIO.press.
+
+    Edge callbacks run in one callback thread, and "bouncetime" suppresses
+    further edges for that many milliseconds, like in RPi.GPIO.
+'''
+import atexit
+import sys
+if sys.hexversion < 0x03000000:
+    from Queue import Queue
+else:
+    from queue import Queue
+from bisect import bisect_right
+from math import pi, sin
+import os
+import threading
+import time
+from timeit import default_timer as timer
+import types
+
+from configuration import config
+import registry
+import uptime
+
+class SimulatedGPIO(types.ModuleType):
+    '''The part of the RPi.GPIO interface which the controller uses, with
+    call counters.'''
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self):
+        types.ModuleType.__init__(self, 'RPi.GPIO')
+        self.clocks = {}     # clock pin -> Sht75
+        self.datas = {}      # data pin -> Sht75
+        self.direction = {}
+        self.pull = {}
+        self.outputs = {}    # level set by the controller
+        self.driven = {}     # level set by an external device
+        self.events = {}     # pin -> [edge, callback, bouncetime, level, t]
+        self.lock = threading.Lock()
+        self.dispatcher = None
+        self.dcf77 = None    # pin of the DCF77 receiver
+        self.transmitter = None
+        self.calls = dict(setup=0, output=0, input=0)
+        if hasattr(os, 'register_at_fork'): # Python >= 3.7
+            os.register_at_fork(after_in_child=self._afterFork)
+
+    def _afterFork(self):
+        # Another thread might have held the lock at the fork.
+        self.lock = threading.Lock()
+        self.dispatcher = None
+
+    @staticmethod
+    def _pins(pins):
+        return pins if isinstance(pins, (list, tuple)) else (pins,)
+
+    def attach(self, clock, data, sensor):
+        '''Connect an SHT75 to a clock and a data pin.'''
+        self.clocks[clock] = sensor
+        self.datas[data] = sensor
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def cleanup(self, pins=None):
+        if pins is None:
+            pins = list(self.direction)
+        for pin in self._pins(pins):
+            self.direction.pop(pin, None)
+            self.outputs.pop(pin, None)
+            self.events.pop(pin, None)
+            if pin == self.dcf77 and self.transmitter is not None:
+                self.transmitter.stop()
+                self.transmitter = None
+
+    def setup(self, pins, direction, pull_up_down=PUD_OFF, initial=None):
+        self.calls['setup'] += 1
+        for pin in self._pins(pins):
+            self.direction[pin] = direction
+            self.pull[pin] = pull_up_down
+            if direction == self.OUT and initial is not None:
+                self.outputs[pin] = 1 if initial else 0
+            if pin == self.dcf77 and self.transmitter is None:
+                self.transmitter = DCF77Transmitter(self, pin)
+                self.transmitter.start()
+                # Stop it before the interpreter shuts down.
+                atexit.register(self.transmitter.stop)
+
+    def output(self, pins, v):
+        self.calls['output'] += 1
+        v = 1 if v else 0
+        for pin in self._pins(pins):
+            self.outputs[pin] = v
+            if pin in self.clocks:
+                self.clocks[pin].onClock(v)
+            elif pin in self.datas:
+                self.datas[pin].onData(v)
+            if pin in self.events:
+                self.changed(pin)
+
+    def input(self, pin):
+        self.calls['input'] += 1
+        return self.level(pin)
+
+    def level(self, pin):
+        '''Current level of a pin, without counting a call.'''
+        if self.direction.get(pin) == self.OUT:
+            return self.outputs.get(pin, 0)
+        sensor = self.datas.get(pin)
+        if sensor is not None:
+            return sensor.level()
+        v = self.driven.get(pin)
+        if v is not None:
+            return v
+        return 1 if self.pull.get(pin) == self.PUD_UP else 0
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self.lock:
+            if pin in self.events:
+                raise RuntimeError('Conflicting edge detection already '
+                                   'enabled for this GPIO channel')
+            self.events[pin] = [edge, callback, bouncetime, self.level(pin),
+                                None]
+
+    def remove_event_detect(self, pin):
+        with self.lock:
+            self.events.pop(pin, None)
+
+    def drive(self, pin, v):
+        '''An external device sets the level of an input pin (None:
+        released, the pull-up/down resistor determines the level).'''
+        self.driven[pin] = v
+        self.changed(pin)
+
+    def press(self, pin, duration=0.2):
+        '''Press a button (pulls the pin low) for "duration" seconds.'''
+        self.drive(pin, 0)
+        threading.Timer(duration, self.drive, (pin, None)).start()
+
+    def notify(self, sensor):
+        '''An SHT75 has changed the level of its data line.'''
+        for pin, s in list(self.datas.items()):
+            if s is sensor:
+                self.changed(pin)
+
+    def changed(self, pin):
+        '''Run the callback if the level of the pin changed as requested.'''
+        with self.lock:
+            event = self.events.get(pin)
+            if event is None:
+                return
+            edge, callback, bouncetime, last, t = event
+            v = self.level(pin)
+            if v == last:
+                return
+            event[3] = v
+            if edge != self.BOTH and edge != (self.RISING if v
+                                               else self.FALLING):
+                return
+            now = timer()
+            if bouncetime and t is not None and now - t < bouncetime * 1e-3:
+                return
+            event[4] = now
+            if callback is not None:
+                self._dispatch(callback, pin)
+
+    def _dispatch(self, callback, pin):
+        # Started on demand: after a fork (see acquisition.py), the child
+        # has no callback thread.
+        if self.dispatcher is None or not self.dispatcher.is_alive():
+            self.queue = Queue()
+            self.dispatcher = threading.Thread(target=self._callbacks,
+                                               args=(self.queue,),
+                                               name='GPIO callbacks')
+            self.dispatcher.daemon = True
+            self.dispatcher.start()
+        self.queue.put((callback, pin))
+
+    @staticmethod
+    def _callbacks(queue):
+        while True:
+            callback, pin = queue.get()
+            try:
+                callback(pin)
+            except Exception as e:
+                sys.stderr.write('GPIO callback for pin {}: {}\n'.
+                                 format(pin, e))
+
+def constant(T, rH):
+    '''Climate with fixed readings, for Sht75.'''
+    return lambda: (T, rH)
+
+class Sht75:
+    '''SHT75 bus protocol on one clock/data pin pair, including the status
+    register. "climate" returns the current (T, rH).
+
+    Conversions take "conversion_time" seconds, or the typical times from
+    the datasheet for the current resolution if this is None.'''
+    def __init__(self, gpio, climate, conversion_time=None):
+        self.gpio = gpio
+        self.climate = climate
+        self.conversion_time = conversion_time
+        self.status = 0
+        self.state = 'idle'
+        self.sck = 0
+        self.data = 1
+
+    def rawValue(self, cmd):
+        # Not at module level: sht75 imports this module (through gpio.py).
+        import sht75
+        c = sht75.Sht.c_low if self.status & 1 else sht75.Sht.c
+        T, rH = self.climate()
+        if cmd == 0b00000011:
+            return int(round((T - c.compute_d1(3.3)) / c.d2))
+        # Invert the compensated humidity conversion (Tables 6 and 7) by
+        # Newton's method.
+        x = (rH - c.c1) / c.c2
+        for i in range(5):
+            x -= ((c.c1 + c.c2 * x + c.c3 * x * x + (T - 25) * (c.t1 + c.t2 * x)
+                   - rH)
+                  / (c.c2 + 2 * c.c3 * x + (T - 25) * c.t2))
+        return max(0, int(round(x)))
+
+    def crc(self, data):
+        import sht75
+        s = self.status
+        init = (s & 1) << 7 | (s & 2) << 5 | (s & 4) << 3 | (s & 8) << 1
+        return sht75.ShtComms.__dict__['_crc8'](None, data, init)
+
+    def sendBytes(self, data):
+        self.bits = []
+        for byte in data:
+            self.bits += [(byte >> 7 - n) & 1 for n in range(8)] + [0]
+        self.pointer = 0
+
+    def level(self):
+        '''Data line level driven by the sensor (1 = released).'''
+        if self.state == 'ack':
+            return 0
+        if self.state == 'convert':
+            # The host checks the released line right after the ACK; a
+            # short emulated conversion must not end before that.
+            if timer() < self.ready or not self.released:
+                self.released = True
+                return 1
+            self.state = 'read'
+        if self.state == 'read':
+            return self.bits[self.pointer]
+        return 1
+
+    def onData(self, v):
+        if self.sck:
+            if self.data and not v:
+                self.state = 'start'
+            elif not self.data and v and self.state == 'start':
+                self.state = 'cmd'
+                self.cmd = 0
+                self.bitcount = 0
+        self.data = v
+
+    def onClock(self, v):
+        if v and not self.sck:
+            if self.state == 'cmd':
+                self.cmd = (self.cmd << 1) | self.data
+                self.bitcount += 1
+        elif not v and self.sck:
+            if self.state == 'cmd' and self.bitcount == 8:
+                self.state = 'ack'
+            elif self.state == 'ack':
+                self.onCommand()
+            elif self.state == 'read':
+                self.pointer += 1
+                if self.pointer == len(self.bits):
+                    self.state = 'idle'
+        self.sck = v
+
+    def onCommand(self):
+        if getattr(self, 'writeStatus', False):
+            self.writeStatus = False
+            self.status = self.cmd & 0b00000111
+            self.state = 'idle'
+        elif self.cmd == 0b00000110:
+            self.writeStatus = True
+            self.state = 'cmd'
+            self.cmd = 0
+            self.bitcount = 0
+        elif self.cmd == 0b00000111:
+            self.sendBytes((self.status, self.crc((self.cmd, self.status))))
+            self.state = 'read'
+        else:
+            self.startConversion()
+
+    def startConversion(self):
+        low = self.status & 1
+        raw = self.rawValue(self.cmd)
+        v0, v1 = raw >> 8, raw & 0xff
+        self.sendBytes((v0, v1, self.crc((self.cmd, v0, v1))))
+        self.state = 'convert'
+        self.released = False
+        duration = self.conversion_time
+        if duration is None:
+            duration = {0b00000011: (.32, .08),
+                        0b00000101: (.08, .02)}.get(self.cmd, (.001,) * 2)[low]
+        # The conversion time passes on the clock of the controller, which
+        # might be a virtual one.
+        duration /= getattr(uptime.clock, 'speed', 1.0)
+        self.ready = timer() + duration
+        timer_thread = threading.Timer(duration, self.gpio.notify, (self,))
+        timer_thread.daemon = True
+        timer_thread.start()
+
+class ClimateTrace:
+    '''Temperature and relative humidity of each sensor over the day.
+
+    The trace file has lines "seconds, T_1, rH_1, ..., T_n, rH_n" with the
+    sensors in the order of registry.py, sorted by the time in seconds since
+    local midnight. Values are interpolated linearly, and the trace repeats
+    after the last time. Lines starting with "#" are comments.
+
+    Without a file, sensor 1 is indoors (mild daily cycle) and the others
+    are outdoors (warmer and drier in the afternoon).'''
+    def __init__(self, filename=None, sensors=2):
+        self.sensors = sensors
+        self.times = None
+        if filename:
+            self.times, self.values = [], []
+            with open(filename) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    row = [float(x) for x in line.split(',')]
+                    if len(row) != 1 + 2 * sensors:
+                        raise ValueError('Climate trace {}: expected {} '
+                                         'values per line: {}'.
+                                         format(filename, 1 + 2 * sensors,
+                                                line))
+                    self.times.append(row[0])
+                    self.values.append(row[1:])
+            if len(self.times) < 2:
+                raise ValueError('Climate trace {}: fewer than two lines.'.
+                                 format(filename))
+
+    @staticmethod
+    def timeOfDay():
+        now = uptime.Time()
+        t = time.localtime(now)
+        return t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec + now % 1
+
+    def __call__(self, t, sensor):
+        '''(T, rH) of a sensor at "t" seconds after midnight.'''
+        if self.times is None:
+            phase = sin(2 * pi * (t / 86400.0 - .375)) # maximum at 15:00
+            if sensor == 0:
+                return 20.0 + 1.0 * phase, 55.0 - 3.0 * phase
+            return 10.0 - sensor + 6.0 * phase, 75.0 - 15.0 * phase
+        times, values = self.times, self.values
+        t = times[0] + (t - times[0]) % (times[-1] - times[0])
+        i = min(max(bisect_right(times, t) - 1, 0), len(times) - 2)
+        w = (t - times[i]) / (times[i + 1] - times[i])
+        v0, v1 = values[i], values[i + 1]
+        return tuple(v0[j] + w * (v1[j] - v0[j])
+                     for j in (2 * sensor, 2 * sensor + 1))
+
+    def sensor(self, i):
+        '''Climate of sensor i, for Sht75.'''
+        return lambda: self(self.timeOfDay(), i)
+
+def dcf77Bits(t):
+    '''The 59 bits which a DCF77 receiver gets in the minute before the
+    local time t (seconds since the epoch), i.e. the bits for minute t.'''
+    lt = time.localtime(t)
+    def bcd(value, width):
+        value = value % 10 + (value // 10 << 4)
+        return [(value >> n) & 1 for n in range(width)]
+    def parity(bits):
+        return bits + [sum(bits) & 1]
+    return ([0] * 17 + [int(lt.tm_isdst > 0), int(lt.tm_isdst <= 0), 0, 1]
+            + parity(bcd(lt.tm_min, 7))
+            + parity(bcd(lt.tm_hour, 6))
+            + parity(bcd(lt.tm_mday, 6) + bcd(lt.tm_wday + 1, 3)
+                     + bcd(lt.tm_mon, 5) + bcd(lt.tm_year % 100, 8)))
+
+class DCF77Transmitter(threading.Thread):
+    '''Drives the data pin of the DCF77 receiver: low for 100 ms (bit 0) or
+    200 ms (bit 1) at the start of each second, no pulse in second 59.'''
+    def __init__(self, gpio, pin):
+        threading.Thread.__init__(self, name='DCF77 simulation')
+        self.daemon = True
+        self.gpio = gpio
+        self.pin = pin
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            now = time.time()
+            second = int(now) + 1
+            if self.stopped.wait(second - now):
+                return
+            lt = time.localtime(second)
+            if lt.tm_sec < 59:
+                bit = dcf77Bits(second - lt.tm_sec + 60)[lt.tm_sec]
+                self.gpio.drive(self.pin, 0)
+                self.stopped.wait(.2 if bit else .1)
+                self.gpio.drive(self.pin, 1)
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join()
+
+_simulation = None
+
+def simulation():
+    '''The simulated hardware of fancontrol.cfg: sensors of the registry
+    with the climate trace from section [simulation], option "climate"
+    (default: synthetic), and the DCF77 receiver, which starts to send when
+    its pin is set up. Created on first use.'''
+    global _simulation
+    if _simulation is None:
+        gpio = SimulatedGPIO()
+        climate = ClimateTrace(config.get('simulation', 'climate')
+                               if config.has_option('simulation', 'climate')
+                               else None, len(registry.sensors))
+        for i, sensor in enumerate(registry.sensors):
+            gpio.attach(sensor.clock, sensor.data,
+                        Sht75(gpio, climate.sensor(i)))
+        gpio.dcf77 = config.getint('pins', 'dcf77')
+        gpio.drive(gpio.dcf77, 1)
+        _simulation = gpio
+    return _simulation
@@ -0,0 +1,137 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Startup tracer: the time of the module imports (without the nested
+    imports, summed per top-level package) and of each component's __init__
+    and __enter__, until the first measurement. Until then, the fan and the
+    window are not controlled.
+
+    Usage in control.py:
+
+        tracer.install()      # before the imports which are traced
+        ...
+        tracer.uninstall()
+        with Launcher((Display, ...), tracer):
+
+    At the first 'Measurement', the times are posted as 'Startup' and
+    logged.
+'''
+import sys
+if sys.hexversion < 0x03000000:
+    import __builtin__ as builtins
+    defaultLevel = -1 # implicit relative imports
+else:
+    import builtins
+    defaultLevel = 0
+import logging
+import os
+import threading
+from timeit import default_timer as timer
+
+from messageboard import messageboard
+
+logger = logging.getLogger('fancontrol')
+
+def processAge():
+    '''Seconds since the start of this process (Linux only, else 0), with a
+    resolution of one clock tick.'''
+    try:
+        with open('/proc/uptime') as f:
+            now = float(f.read().split()[0])
+        with open('/proc/self/stat') as f:
+            stat = f.read()
+        # Field 22 (starttime) in clock ticks after boot. The command name
+        # in parentheses may contain spaces.
+        ticks = float(stat[stat.rindex(')') + 2:].split()[19])
+        return max(0.0, now - ticks / os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError, ValueError, IndexError):
+        return 0.0
+
+class StartupTracer:
+    def __init__(self):
+        self.start = timer() - processAge()
+        self.imports = {} # module -> seconds without nested imports
+        self.components = [] # (name, seconds)
+        self.importTime = None
+        self.original = None
+        self.thread = None
+        self.stack = []
+
+    def install(self):
+        '''Time the imports of the current thread from now on.'''
+        self.thread = threading.current_thread()
+        self.original = builtins.__import__
+        builtins.__import__ = self.__import
+        messageboard.subscribe('Measurement', self,
+                               StartupTracer.onMeasurement)
+
+    def uninstall(self):
+        builtins.__import__ = self.original
+        self.importTime = timer() - self.start
+
+    def __import(self, name, globals=None, locals=None, fromlist=(),
+                 level=defaultLevel):
+        if name in sys.modules or \
+                threading.current_thread() is not self.thread:
+            return self.original(name, globals, locals, fromlist, level)
+        self.stack.append(0.0)
+        start = timer()
+        try:
+            return self.original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = timer() - start
+            nested = self.stack.pop()
+            # Accumulate per top-level package, also for relative imports
+            # within a package.
+            if level > 0 and globals:
+                name = globals.get('__package__') or name
+            package = name.split('.')[0]
+            self.imports[package] = \
+                self.imports.get(package, 0.0) + elapsed - nested
+            if self.stack:
+                self.stack[-1] += elapsed
+
+    def record(self, name, seconds):
+        self.components.append((name, seconds))
+
+    def summary(self):
+        '''Seconds since the process start, the slowest imports and the
+        component times.'''
+        imports = sorted(self.imports.items(), key=lambda item: -item[1])
+        return dict(elapsed = timer() - self.start,
+                    imports = self.importTime,
+                    slowest = imports[:8],
+                    components = list(self.components))
+
+    def onMeasurement(self, message):
+        messageboard.unsubscribe('Measurement', self)
+        s = self.summary()
+        messageboard.post('Startup', s)
+        logger.info('Startup: first measurement after {:.2f}s, imports '
+                    'done after {:.2f}s.'.format(s['elapsed'],
+                                                 s['imports'] or 0.0))
+        logger.info('Startup: slowest imports: ' + ', '.join(
+            '{} {:.3f}s'.format(name, seconds)
+            for name, seconds in s['slowest']))
+        logger.info('Startup: components: ' + ', '.join(
+            '{} {:.3f}s'.format(name, seconds)
+            for name, seconds in s['components']))
+
+tracer = StartupTracer()
@@ -30,7 +30,11 @@ import tempfile
 import time
 import datetime
 import numpy as np
-import calendar
+
+import binlog
+import logindex
+import logreader
+import registry
 
 config = RawConfigParser()
 config.read('fancontrol.cfg')
@@ -41,33 +45,62 @@ hplus = h + 75
 
 intervals = [5,10,15,20,25,30,40,50,60,75,100,200,300,600] # divisors of h
 
+# (temperature, dew point) curves of further sensors
+colors = [('orange', 'olive'), ('teal', 'purple'), ('brown', 'gray'),
+          ('navy', 'lime')]
+
 today = datetime.date.today()
 
+def binaryRecords(date):
+    '''The records of the binary log for the date (see binlog.py), or None
+    if there is none.'''
+    if not config.has_option('logging', 'binlog'):
+        return None
+    binlogfile = config.get('logging', 'binlog')
+    if date != today:
+        binlogfile = binlogfile + date.strftime('.%Y-%m-%d')
+    if os.path.isfile(binlogfile):
+        return binlog.read(binlogfile)
+
+def fanEvents(records):
+    '''(timestamp, state) for the fan events in binary log records: True
+    (on), False (off) or None (startup or shutdown).'''
+    kind = records['kind']
+    code = records['code']
+    fanOn = binlog.userActions.index('FanOn')
+    fanOff = binlog.userActions.index('FanOff')
+    user = (kind == binlog.USER) & ((code == fanOn) | (code == fanOff))
+    for i in np.flatnonzero((kind == binlog.FAN) | user |
+                            (kind == binlog.STARTUP) |
+                            (kind == binlog.SHUTDOWN)):
+        if kind[i] == binlog.FAN:
+            state = bool(code[i])
+        elif kind[i] == binlog.USER:
+            state = code[i] == fanOn
+        else:
+            state = None
+        yield float(records['time'][i]), state
+
 def nextOffTime(date, starttimestamp):
     date = date + datetime.timedelta(days=1)
     logfile = config.get('logging', 'logfile')
     if date != today:
         logfile = logfile + date.strftime('.%Y-%m-%d')
 
-    if os.path.isfile(logfile):
-        for line in open(logfile, 'r'):
-            entries = [entry.strip() for entry in line.split(',')]
-            t = time.strptime(entries[0], '%Y-%m-%d %H:%M:%S')
-            timestamp = calendar.timegm(t)
-            minute = int(np.floor((timestamp - starttimestamp) / 60))
-            assert minute >= w, (minute, w)
-            if entries[4] == 'fan.py' and entries[5] == 'fan':
-                if entries[6] == 'True':
-                    return
-                elif entries[6] == 'False':
-                    return timestamp
-            elif entries[4] == 'menu.py' and entries[5] == 'user':
-                if entries[6] == 'FanOn':
-                    return
-                if entries[6] == 'FanOff':
-                    return timestamp
-            elif entries[4] == 'control.py' and entries[5] in ('Startup', 'Shutdown'):
-                return timestamp
+    records = binaryRecords(date)
+    if records is not None:
+        for timestamp, state in fanEvents(records):
+            if state:
+                return
+            return timestamp
+    elif logreader.exists(logfile):
+        # First fan event from the index, see logindex.py
+        first = logindex.lookup(logfile, store=date != today)['first']
+        if first is not None:
+            timestamp, state = first
+            if state:
+                return
+            return timestamp
     return time.time()
 
 def lastOnTime(date, starttimestamp):
@@ -78,27 +111,114 @@ def lastOnTime(date, starttimestamp):
 
     lastOnTimestamp = None
 
-    if os.path.isfile(logfile):
-        for line in open(logfile, 'r'):
-            entries = [entry.strip() for entry in line.split(',')]
-            t = time.strptime(entries[0], '%Y-%m-%d %H:%M:%S')
-            timestamp = calendar.timegm(t)
-            minute = int(np.floor((timestamp - starttimestamp) / 60))
-            assert minute < 0
-            if entries[4] == 'fan.py' and entries[5] == 'fan':
-                if entries[6] == 'True':
-                    lastOnTimestamp = timestamp
-                elif entries[6] == 'False':
-                    lastOnTimestamp = None
-            elif entries[4] == 'menu.py' and entries[5] == 'user':
-                if entries[6] == 'FanOn':
-                    lastOnTimestamp = timestamp
-                elif entries[6] == 'FanOff':
-                    lastOnTimestamp = None
-            elif entries[4] == 'control.py' and entries[5] in ('Startup', 'Shutdown'):
-                lastOnTimestamp = None
+    records = binaryRecords(date)
+    if records is not None:
+        for timestamp, state in fanEvents(records):
+            lastOnTimestamp = timestamp if state else None
+    elif logreader.exists(logfile):
+        # Last fan event from the index, see logindex.py
+        last = logindex.lookup(logfile, store=date != today)['last']
+        if last is not None and last[1]:
+            lastOnTimestamp = last[0]
     return lastOnTimestamp
 
+def binMinutes(total, count, minute, values, valid):
+    '''Add the (T, tau) values (rows, sensors, 2) to the sums per sensor
+    and minute "total" (n, w, 2) and their number "count" (n, w), where
+    valid (rows, sensors).'''
+    for i in range(min(len(total), values.shape[1])):
+        m = minute[valid[:, i]]
+        count[i] += np.bincount(m, minlength=w)
+        for j in range(2):
+            total[i, :, j] += np.bincount(m, weights=values[valid[:, i], i, j],
+                                          minlength=w)
+
+def mean(total, count):
+    '''Averages per sensor and minute, NaN for minutes without values.'''
+    count = count[:, :, np.newaxis]
+    return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+def measurementArray(messages, sensors):
+    '''(rows, sensors, 4) array of rH, T, tau, Error for measurement
+    messages with the given number of sensors, converted in one go. Raises
+    ValueError if a message does not parse.'''
+    text = ','.join(messages).replace('False', '0').replace('True', '1')
+    values = np.fromstring(text, sep=',')
+    if values.size != len(messages) * sensors * 4:
+        raise ValueError('Malformed measurement.')
+    return values.reshape(len(messages), sensors, 4)
+
+def read_text_log(logfile, starttimestamp, n):
+    '''(T, tau) per sensor and minute, and the fan on and off times from a
+    text log. The measurement messages are collected in one pass, grouped
+    by the number of sensors, and converted and binned in bulk.'''
+    onTimes = []
+    offTimes = []
+    groups = {} # number of sensors -> (times, messages)
+    for recordType, t, uptime, message in logreader.lines(
+            logfile, (logreader.Measurement, logreader.Fan, logreader.User),
+            starttimestamp, starttimestamp + 60 * w):
+        if recordType is logreader.Measurement:
+            times, messages = groups.setdefault((message.count(',') + 1) // 4,
+                                                ([], []))
+            times.append(t)
+            messages.append(message)
+        else:
+            record = logreader.parseMessage(recordType, t, uptime, message)
+            if isinstance(record, logreader.Fan):
+                (onTimes if record.on else offTimes).append(record.time)
+            elif isinstance(record, logreader.User):
+                if record.action == 'FanOn':
+                    onTimes.append(record.time)
+                elif record.action == 'FanOff':
+                    offTimes.append(record.time)
+
+    total = np.zeros((n, w, 2))
+    count = np.zeros((n, w))
+    for sensors, (times, messages) in groups.items():
+        if sensors == 0:
+            continue
+        try:
+            values = measurementArray(messages, sensors)
+        except ValueError:
+            # Convert line by line and skip the malformed ones.
+            rows = []
+            for i, message in enumerate(messages):
+                try:
+                    rows.append(measurementArray([message], sensors)[0])
+                except ValueError:
+                    times[i] = None
+            times = [t for t in times if t is not None]
+            values = np.array(rows).reshape(len(rows), sensors, 4)
+        minute = np.floor((np.array(times) - starttimestamp) / 60).astype(int)
+        binMinutes(total, count, minute, values[:, :, [1, 2]],
+                   values[:, :, 3] == 0)
+    return mean(total, count), onTimes, offTimes
+
+def read_binary_log(records, starttimestamp, n):
+    '''(T, tau) per sensor and minute, and the fan on and off times from
+    the records of a binary log.'''
+    minute = np.floor((records['time'] - starttimestamp) / 60).astype(int)
+    inDay = (minute >= 0) & (minute < w)
+    measurement = inDay & (records['kind'] == binlog.MEASUREMENT)
+    total = np.zeros((n, w, 2))
+    count = np.zeros((n, w))
+    sensors = records['values'].shape[1]
+    valid = (records['error'][measurement, np.newaxis] >>
+             np.arange(sensors) & 1) == 0
+    binMinutes(total, count, minute[measurement],
+               records['values'][measurement][:, :, [
+                   binlog.fields.index('T'), binlog.fields.index('tau')]],
+               valid)
+    onTimes = []
+    offTimes = []
+    for timestamp, state in fanEvents(records[inDay]):
+        if state:
+            onTimes.append(timestamp)
+        elif state is not None:
+            offTimes.append(timestamp)
+    return mean(total, count), onTimes, offTimes
+
 def read_log(*date):
     date = datetime.date(*date)
     logfile = config.get('logging', 'logfile')
@@ -108,57 +228,16 @@ def read_log(*date):
     t = date.timetuple()
     starttimestamp = time.mktime(t)
 
-    onTimes = []
-    offTimes = []
-    extraOffTimes = [time.time()]
-    data1 = np.zeros((w, 2))
-    data2 = np.zeros((w, 2))
-    num1 = np.zeros((w, 1), dtype=int)
-    num2 = np.zeros((w, 1), dtype=int)
-
-    minT = np.infty
-    maxT = -minT
-
-    for line in open(logfile, 'r'):
-        entries = [entry.strip() for entry in line.split(',')]
-        t = time.strptime(entries[0], '%Y-%m-%d %H:%M:%S')
-        timestamp = calendar.timegm(t)
-        minute = int(np.floor((timestamp - starttimestamp) / 60))
-        assert minute >= 0
-        assert minute < w + 60
-        if minute >= w:
-            continue
-        if entries[4] == 'fan.py' and entries[5] == 'fan':
-            if entries[6] == 'True':
-                onTimes.append(timestamp)
-            elif entries[6] == 'False':
-                offTimes.append(timestamp)
-        elif entries[4] == 'control.py' and entries[5] in ('Startup', 'Shutdown'):
-            extraOffTimes.append(timestamp)
-        elif entries[4] == 'menu.py' and entries[5] == 'user':
-            if entries[6] == 'FanOn':
-                onTimes.append(timestamp)
-            elif entries[6] == 'FanOff':
-                offTimes.append(timestamp)
-        elif entries[4] == 'sensor.py' and entries[5] == 'measurement':
-            if minute >= 0 and minute<= w:
-                rH1, T1, tau1, Error1, rH2, T2, tau2, Error2 = entries[6:]
-                if Error1 == 'False':
-                    T1 = float(T1)
-                    tau1 = float(tau1)
-                    data1[minute] += (T1, tau1)
-                    num1[minute] += 1
-                if Error2 == 'False':
-                    T2 = float(T2)
-                    tau2 = float(tau2)
-                    data2[minute] += (T2, tau2)
-                    num2[minute] += 1
-    # Prevent "RuntimeWarning: invalid value encountered in true_divide"
-    data1 = np.where(num1>0, data1, np.nan) / num1
-    data2 = np.where(num2>0, data2, np.nan) / num2
-
-    minT = np.nanmin([np.nanmin(data1), np.nanmin(data2)])
-    maxT = np.nanmax([np.nanmax(data1), np.nanmax(data2)])
+    # (T, tau) per minute and sensor
+    n = len(registry.sensors)
+    records = binaryRecords(date)
+    if records is not None:
+        data, onTimes, offTimes = read_binary_log(records, starttimestamp, n)
+    else:
+        data, onTimes, offTimes = read_text_log(logfile, starttimestamp, n)
+
+    minT = np.nanmin(data)
+    maxT = np.nanmax(data)
 
     extraOnTime = lastOnTime(date, starttimestamp)
     if extraOnTime is not None:
@@ -166,8 +245,10 @@ def read_log(*date):
     extraOffTime = nextOffTime(date, starttimestamp)
     if extraOffTime is not None:
         offTimes.append(extraOffTime)
-    onTimes.sort()
-    offTimes.sort()
+    # Whole seconds, as in the text log without milliseconds: an event at
+    # hh:mm:00.5 belongs to the minute hh:mm.
+    onTimes = sorted(int(t) for t in onTimes)
+    offTimes = sorted(int(t) for t in offTimes)
 
     fanIntervals = []
     for onTime in onTimes:
@@ -184,7 +265,7 @@ def read_log(*date):
             x2 = min(x2, w-1)
 
             fanIntervals.append((x1, x2))
-    return data1, data2, minT, maxT, fanIntervals
+    return data, minT, maxT, fanIntervals
 
 def plotcurve(SE, elem, points, maxT, minT, color):
     if points:
@@ -214,7 +295,11 @@ def make_plot(date, upload=False, mark_end=False):
     month = date.month
     day = date.day
 
-    data1, data2, minT, maxT, fanIntervals = read_log(year, month, day)
+    data, minT, maxT, fanIntervals = read_log(year, month, day)
+    data1 = data[registry.indoor]
+    data2 = data[registry.outdoor]
+    others = [i for i in range(len(data))
+              if i not in (registry.indoor, registry.outdoor)]
 
     minTf = minT
     maxTf = maxT
@@ -282,6 +367,13 @@ line.thicker{stroke-width:.25px}''')
         tspan = SE(text, 'tspan', dx="1em", style="fill:magenta")
         tspan.text = u'■'
         tspan.tail = ' Dew point outdoors'
+        for i, (Tcolor, taucolor) in zip(others, colors):
+            tspan = SE(text, 'tspan', dx="1em", style="fill:" + Tcolor)
+            tspan.text = u'■'
+            tspan.tail = ' Temperature {} '.format(registry.names[i])
+            tspan = SE(text, 'tspan', dx="1em", style="fill:" + taucolor)
+            tspan.text = u'■'
+            tspan.tail = ' Dew point {}'.format(registry.names[i])
         tspan = SE(text, 'tspan', dx="1em", style="fill:rgb(180,180,180)")
         tspan.text = u'■'
         tspan.tail = ' Fan is on'
@@ -364,6 +456,9 @@ line.thicker{stroke-width:.25px}''')
         plot(SE, g2, data1[:,1], maxT, minT, 'green')
         plot(SE, g2, data2[:,0], maxT, minT, 'red')
         plot(SE, g2, data2[:,1], maxT, minT, 'magenta')
+        for i, (Tcolor, taucolor) in zip(others, colors):
+            plot(SE, g2, data[i, :, 0], maxT, minT, Tcolor)
+            plot(SE, g2, data[i, :, 1], maxT, minT, taucolor)
 
         ET = etree.ElementTree(svg)
         filename = 'fancontrol_{year:04}-{month:02}-{day:02}.svg'.format(
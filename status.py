@@ -29,6 +29,8 @@ C_HTML_OK = 'color:#007f00'
 C_HTML_ALERT = 'color:#009fff'
 
 class Status(Component):
+    requires = ('HtmlWriter',)
+
     def __init__(self):
         Component.__init__(self, 'status')
         self.new_measurement = False
@@ -46,8 +48,7 @@ class Status(Component):
     def onMeasurement(self, message):
         with self.lock:
             self.new_measurement = True
-            uptime, S1Data, S2Data = message
-            self.measurement_error = S1Data.Error or S2Data.Error
+            self.measurement_error = any(S.Error for S in message[1:])
 
             self.__generateDisplayStatus()
             self.__generateHTMLStatus()
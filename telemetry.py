@@ -0,0 +1,116 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+'''
+    Copyright © 2016 Daniel Müllner <http://danifold.net>
+    All changes from 2017-12-27 on: Copyright © Google Inc. <http://google.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Timing telemetry: histograms of durations in fixed buckets, e.g. the
+    lateness of the scheduler jobs, the duration of the message board
+    callbacks per heading and subscriber, and the sensor readout.
+
+    Every "interval" seconds (section [telemetry] in fancontrol.cfg), the
+    histograms of the past interval are posted as 'Telemetry' and written
+    to the log in one compact line, then they restart from zero.
+
+    Updates from several threads are not locked: a rare lost count is
+    cheaper than a lock in every message board post.
+'''
+from bisect import bisect_left
+import logging
+
+from configuration import config
+from messageboard import messageboard
+
+logger = logging.getLogger('fancontrol')
+
+interval = config.getint('telemetry', 'interval') \
+    if config.has_option('telemetry', 'interval') else 600
+
+# Upper bucket bounds in seconds: 1-2-5 steps from 100 µs to 10 s, and one
+# bucket for longer durations.
+bounds = [m * 10 ** e for e in range(-4, 1) for m in (1, 2, 5)] + [10]
+
+class Histogram:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        '''Upper bound of the bucket which contains the q-quantile (the
+        maximum for the last bucket).'''
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return dict(count = self.count,
+                    mean = self.sum / self.count if self.count else 0.0,
+                    p50 = self.quantile(.5),
+                    p99 = self.quantile(.99),
+                    max = self.max,
+                    counts = list(self.counts))
+
+class Telemetry:
+    def __init__(self, interval=interval):
+        self.interval = interval # seconds between reports
+        self.histograms = {}
+
+    def histogram(self, name):
+        '''The histogram of the given name, created on first use.'''
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def add(self, name, seconds):
+        self.histogram(name).add(seconds)
+
+    def report(self, uptime=None):
+        '''Post the summaries of the past interval as 'Telemetry' (name ->
+        dictionary, see Histogram.summary), log them and restart the
+        histograms.'''
+        summaries = {}
+        for name, histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                summaries[name] = histogram.summary()
+                histogram.reset()
+        messageboard.post('Telemetry', summaries)
+        # name=count/p50/p99/max with the times in ms
+        logger.info('telemetry,' + ';'.join(
+            '{}={}/{:.1f}/{:.1f}/{:.1f}'.format(name, s['count'],
+                                                s['p50'] * 1e3,
+                                                s['p99'] * 1e3,
+                                                s['max'] * 1e3)
+            for name, s in sorted(summaries.items())))
+
+telemetry = Telemetry()
@@ -16,8 +16,20 @@
 
     You should have received a copy of the GNU General Public License
     along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+    Uptime of the computer in seconds. The clock source is exchangeable:
+    by default the monotonic clock, shifted to the uptime (see
+    MonotonicClock);
+    with the environment variable FANCONTROL_CLOCK_SPEED=n, a virtual clock
+    which runs n times faster than real time, e.g. to simulate a day of
+    controller behaviour together with the simulated GPIO (simgpio.py).
+
+    Code which waits for a span of uptime uses Sleep instead of time.sleep.
 '''
+import os
 import threading
+import time
 
 class _Uptimefile:
     def __init__(self):
@@ -34,12 +46,124 @@ _uptimefile = _Uptimefile()
 _f = _uptimefile.file()
 _lock = threading.Lock()
 
-def UptimeAsString():
-    '''Uptime in Seconds'''
+def afterFork():
+    '''Call in a forked child process: the open file shares its offset
+    with the parent, and another thread of the parent might have held the
+    lock at the fork.'''
+    global _uptimefile, _f, _lock
+    _lock = threading.Lock()
+    _uptimefile = _Uptimefile()
+    _f = _uptimefile.file()
+
+def _procUptime():
     with _lock:
         _f.seek(0)
-        return _f.read().split()[0]
+        return float(_f.read().split()[0])
+
+def _clockGettime():
+    '''time.monotonic for Python 2: clock_gettime(CLOCK_MONOTONIC) through
+    ctypes, or None if it is not available.'''
+    try:
+        import ctypes
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+        CLOCK_MONOTONIC = 1 # Linux
+        for name in ('librt.so.1', None): # glibc < 2.17: in librt
+            try:
+                clock_gettime = ctypes.CDLL(name, use_errno=True).clock_gettime
+                break
+            except (OSError, AttributeError):
+                clock_gettime = None
+        if clock_gettime is None:
+            return None
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        def monotonic():
+            t = timespec()
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)):
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return t.tv_sec + t.tv_nsec * 1e-9
+        monotonic()
+        return monotonic
+    except (ImportError, OSError):
+        return None
+
+# Monotonic clock in seconds, or None
+monotonic = getattr(time, 'monotonic', None) or _clockGettime()
+
+class ProcClock:
+    '''Reads /proc/uptime at every call (lock, seek, read, parse).'''
+    def __call__(self):
+        return _procUptime()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def time(self):
+        return time.time()
+
+class MonotonicClock(ProcClock):
+    '''The monotonic clock, shifted to the uptime once at the start. No file
+    access and no lock per call. (The system uptime also counts a suspend,
+    which the monotonic clock does not; the controller never suspends.)'''
+    def __init__(self):
+        self.offset = _procUptime() - monotonic()
+
+    def __call__(self):
+        return monotonic() + self.offset
+
+class VirtualClock(ProcClock):
+    '''Uptime which runs "speed" times faster than real time from "start"
+    on (default: the current uptime). sleep() sleeps correspondingly
+    shorter, and advance() jumps forward. time() is the matching wall-clock
+    time.'''
+    def __init__(self, speed=1.0, start=None):
+        self.speed = float(speed)
+        self.real0 = _realClock()
+        self.start = self.real0 if start is None else start
+        self.time0 = time.time()
+        self.skipped = 0.0
+
+    def __call__(self):
+        return self.start + self.skipped + \
+            (_realClock() - self.real0) * self.speed
+
+    def sleep(self, seconds):
+        time.sleep(seconds / self.speed)
+
+    def advance(self, seconds):
+        self.skipped += seconds
+
+    def time(self):
+        return self.time0 + self() - self.start
+
+_realClock = MonotonicClock() if monotonic is not None else ProcClock()
+
+def _defaultClock():
+    speed = float(os.environ.get('FANCONTROL_CLOCK_SPEED', 1))
+    return _realClock if speed == 1 else VirtualClock(speed)
+
+clock = _defaultClock()
+
+def setClock(newclock):
+    '''Replace the clock, e.g. by a VirtualClock. Call this before the
+    components are started.'''
+    global clock
+    clock = newclock
+
+def UptimeAsString():
+    '''Uptime in Seconds, in the format of /proc/uptime'''
+    return '{:.2f}'.format(clock())
 
 def Uptime():
     '''Uptime in Seconds'''
-    return float(UptimeAsString())
+    return clock()
+
+def Sleep(seconds):
+    '''time.sleep for "seconds" of uptime'''
+    clock.sleep(seconds)
+
+def Time():
+    '''Wall-clock time (seconds since the epoch) which matches the
+    uptime'''
+    return clock.time()